@@ -1,5 +1,6 @@
 from . import controllers
 from . import models
 from . import wizards
+from . import report
 from . import tests
 from .post_init_hook import _post_init_hook
\ No newline at end of file
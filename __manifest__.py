@@ -13,10 +13,12 @@
     'depends': ['base', 'contacts', 'mail'],
     'data': [
         'security/ir.model.access.csv',
+        'security/hr_hospital_security.xml',
 
         'data/hr_hospital_sequence_data.xml',
         'data/hr_hospital_doctor_speciality_data.xml',
         'data/hr_hospital_disease_data.xml',
+        'data/hr_hospital_cron_data.xml',
 
         'views/hr_hospital_abstract_person_views.xml',
         'views/hr_hospital_contact_person_views.xml',
@@ -28,6 +30,10 @@
         'views/hr_hospital_patient_doctor_history_views.xml',
         'views/hr_hospital_visit_views.xml',
         'views/hr_hospital_diagnosis_views.xml',
+        'views/hr_hospital_disease_report_result_views.xml',
+        'views/hr_hospital_disease_incidence_views.xml',
+        'views/hr_hospital_patient_card_export_job_views.xml',
+        'views/hr_hospital_export_watermark_views.xml',
 
         'wizards/hr_hospital_mass_reassign_doctor_wizard_views.xml',
         'wizards/hr_hospital_disease_report_wizard_views.xml',
@@ -35,6 +41,8 @@
         'wizards/hr_hospital_doctor_schedule_wizard_views.xml',
         'wizards/hr_hospital_patient_card_export_wizard_views.xml',
 
+        'report/hr_hospital_diagnosis_report_views.xml',
+
         'views/menu.xml',
 
     ],
@@ -1,10 +1,18 @@
+from . import hr_hospital_counter_mixin
 from . import hr_hospital_abstract_person
 from . import hr_hospital_contact_person
 from . import hr_hospital_disease
 from . import hr_hospital_doctor_speciality
 from . import hr_hospital_doctor
 from . import hr_hospital_doctor_schedule
+from . import hr_hospital_doctor_slot_stamp
 from . import hr_hospital_patient
 from . import hr_hospital_patient_doctor_history
 from . import hr_hospital_visit
 from . import hr_hospital_diagnosis
+from . import hr_hospital_diagnosis_daily
+from . import hr_hospital_disease_incidence
+from . import hr_hospital_disease_report_result
+from . import hr_hospital_patient_card_export_job
+from . import hr_hospital_export_watermark
+from . import ir_attachment
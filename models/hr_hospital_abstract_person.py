@@ -1,11 +1,26 @@
 # -*- coding: utf-8 -*-
+import calendar
 import re
-from datetime import date
+from datetime import date, timedelta
 
 from odoo import models, fields, api
 from odoo.exceptions import ValidationError
 from odoo import _
 
+# Beyond this many missed days every row is recomputed
+MAX_REFRESH_DAYS = 366
+
+
+def _anniversary_month_days(days):
+    """(month, day) pairs whose yearly anniversary falls on one of days"""
+    pairs = set()
+    for day in days:
+        pairs.add((day.month, day.day))
+        # February 29 anniversaries are reached on March 1 in common years
+        if (day.month, day.day) == (3, 1) and not calendar.isleap(day.year):
+            pairs.add((2, 29))
+    return pairs
+
 
 class AbstractPerson(models.AbstractModel):
     _name = 'abstract.person'
@@ -70,6 +85,16 @@ class AbstractPerson(models.AbstractModel):
         help='Language of communication'
     )
 
+    def init(self):
+        if self._abstract:
+            return
+        # Birthday lookups by (month, day), used by the anniversary searches
+        index_name = self._table.replace('hr_hospital_', 'idx_') + '_birthday'
+        self.env.cr.execute(f"""
+            CREATE INDEX IF NOT EXISTS {index_name} ON {self._table}
+                   ((EXTRACT(MONTH FROM birth_date)), (EXTRACT(DAY FROM birth_date)))
+        """)
+
     # Age computation
     @api.depends('birth_date')
     def _compute_age(self):
@@ -116,3 +141,51 @@ class AbstractPerson(models.AbstractModel):
         for record in self:
             if record.birth_date and record.birth_date > date.today():
                 raise ValidationError(_('Date of birth cannot be in the future.'))
+
+    # Daily refresh of date-dependent stored fields
+    @api.model
+    def _get_pending_refresh_days(self, param_name):
+        """Days elapsed since the last refresh, or None when every row must be recomputed"""
+        last_run = self.env['ir.config_parameter'].sudo().get_param(param_name)
+        if not last_run:
+            return None
+        today = date.today()
+        last_run = fields.Date.to_date(last_run)
+        if (today - last_run).days > MAX_REFRESH_DAYS:
+            return None
+        return [last_run + timedelta(days=offset) for offset in range(1, (today - last_run).days + 1)]
+
+    @api.model
+    def _search_anniversaries(self, date_field, days):
+        """Records whose date_field anniversary falls on one of days (all records if days is None)"""
+        if days is None:
+            return self.search([(date_field, '!=', False)])
+        pairs = _anniversary_month_days(days)
+        if not pairs:
+            return self.browse()
+        self.flush_model([date_field])
+        # Served by the (month, day) expression index created in init()
+        self.env.cr.execute(f"""
+            SELECT id FROM {self._table}
+             WHERE (EXTRACT(MONTH FROM {date_field}), EXTRACT(DAY FROM {date_field})) IN %s
+        """, [tuple(pairs)])
+        return self.browse([row[0] for row in self.env.cr.fetchall()])
+
+    @api.model
+    def _recompute_stored_field(self, field_name, records):
+        if records:
+            self.env.add_to_compute(self._fields[field_name], records)
+            records.flush_recordset([field_name])
+
+    @api.model
+    def _cron_refresh_age(self):
+        """Recompute age only for the people whose birthday passed since the last run"""
+        days = self._get_pending_refresh_days('hr_hospital.age_last_refresh')
+        for model_name in self.env.registry.descendants(['abstract.person'], '_inherit'):
+            model = self.env[model_name]
+            if model._abstract or model._transient:
+                continue
+            model._recompute_stored_field('age', model._search_anniversaries('birth_date', days))
+        self.env['ir.config_parameter'].sudo().set_param(
+            'hr_hospital.age_last_refresh', fields.Date.to_string(date.today())
+        )
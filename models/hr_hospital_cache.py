@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class HospitalCache:
+    """Process-level LRU cache with a time-to-live and hit/miss counters
+
+    Entries are local to the worker process. Writes invalidate the entries of
+    the current process right away; values carry the database stamp version
+    they were built from, so other workers detect stale entries on lookup.
+    """
+
+    def __init__(self, max_size=1024, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key, MISSING)
+            if entry is not MISSING and entry[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not MISSING:
+                del self._data[key]
+            self.misses += 1
+            return MISSING
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, predicate=None):
+        """Drop every entry whose key matches predicate (all entries if None)"""
+        with self._lock:
+            if predicate is None:
+                self._data.clear()
+                return
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._data),
+            }
+
+
+# Free intervals per doctor, keyed by (dbname, doctor_id, horizon_start, slot_duration);
+# each value carries the doctor's stamp version it was built from
+slot_cache = HospitalCache(max_size=4096, ttl=60)
+
+# Disease report results, keyed by (dbname, start_date, end_date, *filters);
+# each value carries the rollup stamp version of its date range
+report_cache = HospitalCache(max_size=256, ttl=300)
+
+
+def _invalidate_on_transaction_end(env, invalidate):
+    invalidate()
+    env.cr.postcommit.add(invalidate)
+    env.cr.postrollback.add(invalidate)
+
+
+def invalidate_doctor_slots(env, doctor_ids):
+    """Forget the cached free intervals of the given doctors
+
+    Stamps the doctors in the database, which makes the entries of every
+    worker stale as soon as the transaction commits. Entries of the current
+    process are also dropped now and once the transaction ends.
+    """
+    dbname = env.cr.dbname
+    doctor_ids = set(doctor_ids)
+    if not doctor_ids:
+        return
+    env['hr.hospital.doctor.slot.stamp']._bump(doctor_ids)
+
+    def invalidate():
+        slot_cache.invalidate(lambda key: key[0] == dbname and key[1] in doctor_ids)
+
+    _invalidate_on_transaction_end(env, invalidate)
+
+
+def invalidate_reports(env, date_from=None, date_to=None, days=None):
+    """Forget the cached disease reports whose date range covers the changed data
+
+    Without any bound, every report of the database is dropped. The changed
+    days are stamped in the database for the other workers.
+    """
+    dbname = env.cr.dbname
+    days = sorted(days) if days else None
+    env['hr.hospital.diagnosis.daily.stamp']._bump(days)
+
+    def covers(key):
+        if key[0] != dbname:
+            return False
+        start_date, end_date = key[1], key[2]
+        if days is not None:
+            return any(start_date <= day <= end_date for day in days)
+        return (not date_from or end_date >= date_from) and (not date_to or start_date <= date_to)
+
+    _invalidate_on_transaction_end(env, lambda: report_cache.invalidate(covers))
@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+
+# Diagnosis fields that feed the daily rollup keys and counts. Kept apart from
+# the rollup module so that importing it never registers the rollup models
+# before the diagnosis model they are filled from.
+ROLLUP_FIELDS = {'diagnosis_date', 'disease_id', 'visit_id', 'severity', 'is_approved'}
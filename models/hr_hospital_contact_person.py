@@ -5,7 +5,11 @@ from odoo import models, fields, api
 class HrHospitalContactPerson(models.Model):
     _name = 'hr.hospital.contact.person'
     _description = 'Contact Person'
-    _inherit = ['abstract.person']
+    _inherit = ['abstract.person', 'hr.hospital.counter.mixin']
+
+    _counter_fields = {
+        'related_patients_count': ('patient_ids', []),
+    }
 
     # Relationship field
     relationship = fields.Selection([
@@ -51,5 +55,4 @@ class HrHospitalContactPerson(models.Model):
 
     @api.depends('patient_ids')
     def _compute_related_patients_count(self):
-        for contact in self:
-            contact.related_patients_count = len(contact.patient_ids)
\ No newline at end of file
+        self._compute_counter('related_patients_count')
\ No newline at end of file
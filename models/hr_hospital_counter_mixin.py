@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from odoo import models
+
+
+class HrHospitalCounterMixin(models.AbstractModel):
+    _name = 'hr.hospital.counter.mixin'
+    _description = 'Grouped Count Fields Mixin'
+
+    # Stored count fields maintained with grouped queries:
+    # {count field: (one2many field, extra domain on the child model)}
+    # The domain may also be a callable taking the recordset, for domains
+    # that depend on the current time.
+    _counter_fields = {}
+
+    def _compute_counter(self, field_name):
+        """Set field_name with one grouped count query for the whole batch"""
+        one2many_name, domain = self._counter_fields[field_name]
+        one2many = self._fields[one2many_name]
+        if callable(domain):
+            domain = domain(self)
+
+        records = self.filtered('id')
+        counts = {}
+        if records:
+            counts = {
+                parent.id: count
+                for parent, count in self.env[one2many.comodel_name]._read_group(
+                    [(one2many.inverse_name, 'in', records.ids)] + list(domain),
+                    [one2many.inverse_name],
+                    ['__count']
+                )
+            }
+        for record in records:
+            record[field_name] = counts.get(record.id, 0)
+
+        # New records (onchange) have no rows in the database yet
+        for record in self - records:
+            record[field_name] = len(record[one2many_name].filtered_domain(list(domain)))
@@ -5,6 +5,8 @@ from odoo import models, fields, api
 from odoo.exceptions import ValidationError, UserError
 from odoo import _
 
+from .hr_hospital_constants import ROLLUP_FIELDS
+
 
 class HrHospitalDiagnosis(models.Model):
     _name = 'hr.hospital.diagnosis'
@@ -90,6 +92,37 @@ class HrHospitalDiagnosis(models.Model):
         readonly=True
     )
 
+    # Stored for reporting: grouping by country without joining patients
+    patient_country_id = fields.Many2one(
+        'res.country',
+        string='Patient Country',
+        related='patient_id.country_id',
+        store=True,
+        index=True,
+        readonly=True
+    )
+
+    # Keep the daily rollup in sync
+    @api.model_create_multi
+    def create(self, vals_list):
+        diagnoses = super(HrHospitalDiagnosis, self).create(vals_list)
+        self.env['hr.hospital.diagnosis.daily']._apply_deltas('id', diagnoses.ids, 1)
+        return diagnoses
+
+    def write(self, vals):
+        if not ROLLUP_FIELDS & set(vals):
+            return super(HrHospitalDiagnosis, self).write(vals)
+        rollup = self.env['hr.hospital.diagnosis.daily']
+        rollup._apply_deltas('id', self.ids, -1)
+        res = super(HrHospitalDiagnosis, self).write(vals)
+        rollup._apply_deltas('id', self.ids, 1)
+        return res
+
+    def unlink(self):
+        self.env['hr.hospital.diagnosis.daily']._apply_deltas('id', self.ids, -1)
+        self.env['hr.hospital.export.tombstone']._record(self)
+        return super(HrHospitalDiagnosis, self).unlink()
+
     # Methods
     def action_approve_diagnosis(self):
         for diagnosis in self:
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api, _
+from odoo.exceptions import AccessError
+from odoo.tools.sql import table_exists
+
+from .hr_hospital_cache import invalidate_reports
+
+# Key of a rollup row, matching the unique index targeted by the delta upserts
+ROLLUP_KEY = "day, COALESCE(disease_id, 0), COALESCE(doctor_id, 0), COALESCE(country_id, 0), COALESCE(severity, '')"
+
+
+class HrHospitalDiagnosisDailyStamp(models.Model):
+    _name = 'hr.hospital.diagnosis.daily.stamp'
+    _description = 'Daily Diagnosis Rollup Change Stamp'
+    _log_access = False
+
+    # One row is inserted per changed rollup day, or a row without day when
+    # every report is affected (disease hierarchy). Rows are only
+    # ever inserted, so concurrent writers never wait on each other.
+    day = fields.Date(readonly=True, index=True)
+
+    @api.model
+    def _bump(self, days=None):
+        """Mark the given rollup days as changed, every day when days is None"""
+        if days is None:
+            self.env.cr.execute("INSERT INTO hr_hospital_diagnosis_daily_stamp (day) VALUES (NULL)")
+            return
+        days = sorted(set(days))
+        if days:
+            self.env.cr.execute("""
+                INSERT INTO hr_hospital_diagnosis_daily_stamp (day)
+                SELECT unnest(%s::date[])
+            """, [days])
+
+    @api.model
+    def _get_version(self, date_from=None, date_to=None):
+        """Version of the rollup over a date range, changing with every committed stamp
+
+        As for the doctor slot stamps, the row count catches a stamp committed
+        after a newer one.
+        """
+        self.env.cr.execute("""
+            SELECT COALESCE(MAX(id), 0), COUNT(*)
+              FROM hr_hospital_diagnosis_daily_stamp
+             WHERE day IS NULL
+                OR day BETWEEN COALESCE(%s::date, '-infinity') AND COALESCE(%s::date, 'infinity')
+        """, [date_from, date_to])
+        return self.env.cr.fetchone()
+
+    @api.autovacuum
+    def _gc_old_stamps(self):
+        """Keep only the latest stamp of each day"""
+        self.env.cr.execute("""
+            DELETE FROM hr_hospital_diagnosis_daily_stamp stamp
+             WHERE EXISTS (
+                    SELECT 1
+                      FROM hr_hospital_diagnosis_daily_stamp newer
+                     WHERE newer.day IS NOT DISTINCT FROM stamp.day
+                       AND newer.id > stamp.id
+                   )
+        """)
+
+
+class HrHospitalDiagnosisDaily(models.Model):
+    _name = 'hr.hospital.diagnosis.daily'
+    _description = 'Daily Diagnosis Rollup'
+    _order = 'day desc'
+    _log_access = False
+
+    day = fields.Date(required=True, readonly=True, index=True)
+    disease_id = fields.Many2one('hr.hospital.disease', readonly=True, index=True)
+    doctor_id = fields.Many2one('hr.hospital.doctor', readonly=True)
+    country_id = fields.Many2one('res.country', string='Patient Country', readonly=True)
+    severity = fields.Selection(
+        selection=lambda self: self.env['hr.hospital.diagnosis']._fields['severity'].selection,
+        readonly=True
+    )
+    diagnosis_count = fields.Integer(readonly=True, aggregator='sum')
+    approved_count = fields.Integer(readonly=True, aggregator='sum')
+
+    def init(self):
+        self.env.cr.execute(f"""
+            CREATE UNIQUE INDEX IF NOT EXISTS hr_hospital_diagnosis_daily_key_unique
+                ON hr_hospital_diagnosis_daily ({ROLLUP_KEY})
+        """)
+        # Fill the rollup when the table was just created on an existing
+        # database; on a fresh install there is nothing to fill yet
+        if not table_exists(self.env.cr, 'hr_hospital_diagnosis'):
+            return
+        self.env.cr.execute("SELECT 1 FROM hr_hospital_diagnosis_daily LIMIT 1")
+        if not self.env.cr.fetchone():
+            self._rebuild()
+
+    @api.model
+    def rebuild(self, date_from=None, date_to=None):
+        """Recompute the rollup of a date range from diagnoses, for administrators only"""
+        if not self.env.is_system():
+            raise AccessError(_('Only administrators can rebuild the diagnosis rollup.'))
+        self._rebuild(date_from=date_from, date_to=date_to)
+        return True
+
+    @api.model
+    def _rebuild(self, date_from=None, date_to=None):
+        """Recompute the rollup rows of a date range from diagnoses, the whole history without bounds"""
+        conditions, params = [], []
+        if date_from:
+            conditions.append("day >= %s")
+            params.append(date_from)
+        if date_to:
+            conditions.append("day <= %s")
+            params.append(date_to)
+        where = ' AND '.join(conditions) or 'TRUE'
+
+        self.env['hr.hospital.diagnosis'].flush_model()
+        self.env['hr.hospital.patient'].flush_model(['country_id'])
+        self.env.cr.execute(f"DELETE FROM hr_hospital_diagnosis_daily WHERE {where} RETURNING day", params)
+        days = {day for day, in self.env.cr.fetchall()}
+        self.env.cr.execute(f"""
+            INSERT INTO hr_hospital_diagnosis_daily
+                   (day, disease_id, doctor_id, country_id, severity, diagnosis_count, approved_count)
+            SELECT day, disease_id, doctor_id, country_id, severity,
+                   COUNT(*), COUNT(*) FILTER (WHERE is_approved)
+              FROM (
+                    SELECT d.diagnosis_date::date AS day, d.disease_id, d.doctor_id,
+                           p.country_id, d.severity, d.is_approved
+                      FROM hr_hospital_diagnosis d
+                 LEFT JOIN hr_hospital_patient p ON p.id = d.patient_id
+                     WHERE d.diagnosis_date >= COALESCE(%s::date, '-infinity')
+                       AND d.diagnosis_date < COALESCE(%s::date + 1, 'infinity')
+                   ) AS diagnosis
+             WHERE {where}
+          GROUP BY day, disease_id, doctor_id, country_id, severity
+         RETURNING day
+        """, [date_from, date_to] + params)
+        days.update(day for day, in self.env.cr.fetchall())
+        self.invalidate_model()
+        # Only the days that had or now have rows can change a report
+        if days:
+            invalidate_reports(self.env, days=days)
+
+    @api.model
+    def _apply_deltas(self, field_name, ids, sign):
+        """Add (sign 1) or remove (sign -1) the diagnoses where field_name is one of ids
+
+        Each touched key is upserted with its delta, so concurrent transactions
+        only contend on the rows they really change. Callers remove the
+        diagnoses before a write and add them back once it is done.
+        """
+        if not ids:
+            return
+        self.env['hr.hospital.diagnosis'].flush_model()
+        self.env['hr.hospital.patient'].flush_model(['country_id'])
+        self.env.cr.execute(f"""
+            INSERT INTO hr_hospital_diagnosis_daily AS r
+                   (day, disease_id, doctor_id, country_id, severity, diagnosis_count, approved_count)
+            SELECT d.diagnosis_date::date, d.disease_id, d.doctor_id, p.country_id, d.severity,
+                   %(sign)s * COUNT(*), %(sign)s * COUNT(*) FILTER (WHERE d.is_approved)
+              FROM hr_hospital_diagnosis d
+         LEFT JOIN hr_hospital_patient p ON p.id = d.patient_id
+             WHERE d.{field_name} = ANY(%(ids)s)
+          GROUP BY 1, 2, 3, 4, 5
+       ON CONFLICT ({ROLLUP_KEY}) DO UPDATE
+               SET diagnosis_count = r.diagnosis_count + EXCLUDED.diagnosis_count,
+                   approved_count = r.approved_count + EXCLUDED.approved_count
+         RETURNING id, day, diagnosis_count
+        """, {'sign': sign, 'ids': list(ids)})
+        rows = self.env.cr.fetchall()
+        if not rows:
+            return
+        empty_ids = [row_id for row_id, _day, count in rows if count <= 0]
+        if empty_ids:
+            self.env.cr.execute("DELETE FROM hr_hospital_diagnosis_daily WHERE id = ANY(%s)", [empty_ids])
+        self.invalidate_model()
+        invalidate_reports(self.env, days={day for _row_id, day, _count in rows})
+
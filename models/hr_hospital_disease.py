@@ -2,6 +2,8 @@
 from odoo import models, fields, api
 from odoo.exceptions import ValidationError
 
+from .hr_hospital_cache import invalidate_reports
+
 
 class HrHospitalDisease(models.Model):
     _name = 'hr.hospital.disease'
@@ -10,6 +12,11 @@ class HrHospitalDisease(models.Model):
     _parent_name = "parent_id"
     _parent_store = True
     _rec_name = 'complete_name'
+    _inherit = ['hr.hospital.counter.mixin']
+
+    _counter_fields = {
+        'disease_count': ('diagnosis_ids', []),
+    }
 
     # Main fields
     name = fields.Char(
@@ -109,8 +116,7 @@ class HrHospitalDisease(models.Model):
     # Diagnoses count computation
     @api.depends('diagnosis_ids')
     def _compute_disease_count(self):
-        for disease in self:
-            disease.disease_count = len(disease.diagnosis_ids)
+        self._compute_counter('disease_count')
 
     # Display name computation for Odoo 19.0
     @api.depends('complete_name')
@@ -124,6 +130,12 @@ class HrHospitalDisease(models.Model):
         if not self._check_recursion():
             raise ValidationError(_('You cannot create recursive disease hierarchies.'))
 
+    def write(self, vals):
+        if 'parent_id' in vals:
+            # Category rollups depend on the hierarchy; labels are read on every report
+            invalidate_reports(self.env)
+        return super(HrHospitalDisease, self).write(vals)
+
     # Prevent archiving diseases with active diagnoses
     def toggle_active(self):
         for disease in self:
@@ -136,3 +148,45 @@ class HrHospitalDisease(models.Model):
                     _('Please archive or delete the diagnoses first.')
                 )
         return super(HrHospitalDisease, self).toggle_active()
+
+    def get_hierarchy_diagnosis_counts(self, date_from=None, date_to=None, doctor_ids=None,
+                                       country_ids=None, approved_only=True):
+        """Count diagnoses rolled up to every ancestor category
+
+        Returns {disease_id: count} where each count includes the diagnoses of
+        all descendants. Restricted to the diseases of self (and thus to their
+        subtrees) when self is not empty. Ancestors are taken from parent_path
+        in a single query over the daily rollup, without walking the tree.
+        """
+        self.flush_model(['parent_path'])
+
+        conditions, params = [], []
+        if date_from:
+            conditions.append("r.day >= %s")
+            params.append(date_from)
+        if date_to:
+            conditions.append("r.day <= %s")
+            params.append(date_to)
+        if doctor_ids:
+            conditions.append("r.doctor_id = ANY(%s)")
+            params.append(list(doctor_ids))
+        if country_ids:
+            conditions.append("r.country_id = ANY(%s)")
+            params.append(list(country_ids))
+        if self:
+            conditions.append("ancestor.id::int = ANY(%s)")
+            params.append(self.ids)
+        where = ' AND '.join(conditions) or 'TRUE'
+        count_column = 'approved_count' if approved_only else 'diagnosis_count'
+
+        self.env.cr.execute(f"""
+            SELECT ancestor.id::int, SUM(r.{count_column})
+              FROM hr_hospital_diagnosis_daily r
+              JOIN hr_hospital_disease leaf ON leaf.id = r.disease_id
+             CROSS JOIN LATERAL unnest(string_to_array(rtrim(leaf.parent_path, '/'), '/')) AS ancestor(id)
+             WHERE {where}
+          GROUP BY ancestor.id
+            HAVING SUM(r.{count_column}) > 0
+        """, params)
+        return dict(self.env.cr.fetchall())
+
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+# Weeks averaged by the rolling average (current week included)
+INCIDENCE_ROLLING_WEEKS = 4
+
+# Previous weeks forming the baseline of each week
+INCIDENCE_BASELINE_WEEKS = 12
+
+# Standard deviations above the baseline mean that raise an alert
+INCIDENCE_THRESHOLD_STDDEV = 2.0
+
+# Fewest weekly cases that can raise an alert, so isolated cases stay quiet
+INCIDENCE_MIN_CASES = 3
+
+# Recent weeks recomputed by the daily refresh, catching late diagnoses
+INCIDENCE_REFRESH_WEEKS = 8
+
+
+class HrHospitalDiseaseIncidence(models.Model):
+    _name = 'hr.hospital.disease.incidence'
+    _description = 'Infectious Disease Weekly Incidence'
+    _order = 'week_start desc, case_count desc'
+    _log_access = False
+
+    week_start = fields.Date(required=True, readonly=True, index=True)
+    disease_id = fields.Many2one('hr.hospital.disease', readonly=True, index=True)
+    country_id = fields.Many2one('res.country', string='Patient Country', readonly=True)
+    case_count = fields.Integer(string='Cases', readonly=True, aggregator='sum')
+    rolling_average = fields.Float(digits=(16, 2), readonly=True, aggregator='avg')
+    baseline = fields.Float(
+        digits=(16, 2),
+        readonly=True,
+        aggregator='avg',
+        help='Mean of the previous weeks plus the alert margin in standard deviations'
+    )
+    is_above_baseline = fields.Boolean(string='Above Baseline', readonly=True)
+    is_new_region = fields.Boolean(
+        string='New Region',
+        readonly=True,
+        help='The patient country is not among the distribution regions of the disease'
+    )
+
+    def init(self):
+        # Fill the series when the table was just created on an existing database
+        self.env.cr.execute("SELECT 1 FROM hr_hospital_disease_incidence LIMIT 1")
+        if not self.env.cr.fetchone():
+            self._refresh()
+
+    @api.model
+    def _refresh(self, date_from=None):
+        """Recompute the weekly series from the week of date_from on, the whole history when not given
+
+        Weekly counts come from the daily rollup; the rolling average and the
+        baseline are window aggregates over a gap-free series per disease and
+        country, so a single statement handles every series at once.
+        """
+        self.env['hr.hospital.disease'].flush_model(['is_infectious', 'region_ids'])
+
+        if not date_from:
+            self.env.cr.execute("SELECT MIN(day) FROM hr_hospital_diagnosis_daily")
+            date_from = self.env.cr.fetchone()[0]
+        today = fields.Date.context_today(self)
+        last_week = today - timedelta(days=today.weekday())
+        if date_from:
+            date_from = min(date_from, last_week)
+            first_week = date_from - timedelta(days=date_from.weekday())
+        else:
+            first_week = last_week
+        history_start = first_week - timedelta(weeks=INCIDENCE_BASELINE_WEEKS)
+
+        self.env.cr.execute(
+            "DELETE FROM hr_hospital_disease_incidence WHERE week_start >= %s", [first_week]
+        )
+        self.env.cr.execute(f"""
+            WITH weekly AS (
+                SELECT date_trunc('week', r.day)::date AS week_start, r.disease_id, r.country_id,
+                       SUM(r.diagnosis_count) AS case_count
+                  FROM hr_hospital_diagnosis_daily r
+                  JOIN hr_hospital_disease d ON d.id = r.disease_id
+                 WHERE d.is_infectious
+                   AND r.day >= %(history_start)s
+              GROUP BY 1, 2, 3
+            ), series AS (
+                SELECT pair.disease_id, pair.country_id, week.week_start::date AS week_start,
+                       COALESCE(weekly.case_count, 0) AS case_count
+                  FROM (SELECT DISTINCT disease_id, country_id FROM weekly) AS pair
+            CROSS JOIN generate_series(%(history_start)s::date, %(last_week)s::date,
+                                       interval '1 week') AS week(week_start)
+             LEFT JOIN weekly ON weekly.disease_id = pair.disease_id
+                             AND weekly.country_id IS NOT DISTINCT FROM pair.country_id
+                             AND weekly.week_start = week.week_start
+            ), stats AS (
+                SELECT disease_id, country_id, week_start, case_count,
+                       AVG(case_count) OVER (
+                           series_window ROWS BETWEEN {INCIDENCE_ROLLING_WEEKS - 1} PRECEDING AND CURRENT ROW
+                       ) AS rolling_average,
+                       AVG(case_count) OVER (
+                           series_window ROWS BETWEEN {INCIDENCE_BASELINE_WEEKS} PRECEDING AND 1 PRECEDING
+                       ) + %(threshold)s * COALESCE(STDDEV_POP(case_count) OVER (
+                           series_window ROWS BETWEEN {INCIDENCE_BASELINE_WEEKS} PRECEDING AND 1 PRECEDING
+                       ), 0) AS baseline
+                  FROM series
+                WINDOW series_window AS (PARTITION BY disease_id, country_id ORDER BY week_start)
+            )
+            INSERT INTO hr_hospital_disease_incidence
+                   (week_start, disease_id, country_id, case_count, rolling_average, baseline,
+                    is_above_baseline, is_new_region)
+            SELECT s.week_start, s.disease_id, s.country_id, s.case_count,
+                   s.rolling_average, COALESCE(s.baseline, 0),
+                   s.case_count >= %(min_cases)s AND s.case_count > COALESCE(s.baseline, 0),
+                   s.country_id IS NOT NULL AND NOT EXISTS (
+                       SELECT 1
+                         FROM disease_country_rel rel
+                        WHERE rel.disease_id = s.disease_id
+                          AND rel.country_id = s.country_id
+                   )
+              FROM stats s
+             WHERE s.week_start >= %(first_week)s
+               AND s.case_count > 0
+        """, {
+            'history_start': history_start,
+            'first_week': first_week,
+            'last_week': last_week,
+            'threshold': INCIDENCE_THRESHOLD_STDDEV,
+            'min_cases': INCIDENCE_MIN_CASES,
+        })
+        self.invalidate_model()
+
+    @api.model
+    def _cron_refresh_incidence(self):
+        """Recompute the recent weeks so outbreaks are flagged daily"""
+        today = fields.Date.context_today(self)
+        self._refresh(date_from=today - timedelta(weeks=INCIDENCE_REFRESH_WEEKS - 1))
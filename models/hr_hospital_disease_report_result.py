@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+# Stored report results older than this are removed by the autovacuum
+RESULT_RETENTION_DAYS = 30
+
+
+class HrHospitalDiseaseReportResult(models.Model):
+    _name = 'hr.hospital.disease.report.result'
+    _description = 'Disease Report Result'
+    _order = 'create_date desc, id desc'
+
+    name = fields.Char(required=True, readonly=True)
+    start_date = fields.Date(readonly=True)
+    end_date = fields.Date(readonly=True)
+    group_by = fields.Selection(
+        selection=lambda self: self.env['hr.hospital.disease.report.wizard']._fields['group_by'].selection,
+        readonly=True
+    )
+    sub_group_by = fields.Selection(
+        selection=lambda self: self.env['hr.hospital.disease.report.wizard']._fields['sub_group_by'].selection,
+        string='Breakdown',
+        readonly=True
+    )
+    include_subcategories = fields.Boolean(string='Roll Up to Categories', readonly=True)
+    total_diagnoses = fields.Integer(readonly=True)
+
+    line_ids = fields.One2many(
+        'hr.hospital.disease.report.result.line',
+        'result_id',
+        string='Lines',
+        readonly=True
+    )
+    line_count = fields.Integer(readonly=True)
+
+    def get_page(self, offset=0, limit=80):
+        """Return one page of result lines, so large reports are fetched piece by piece"""
+        self.ensure_one()
+        return {
+            'total': self.line_count,
+            'lines': self.env['hr.hospital.disease.report.result.line'].search_read(
+                [('result_id', '=', self.id)],
+                ['label', 'count', 'breakdown'],
+                offset=offset,
+                limit=limit,
+                order='sequence, id'
+            ),
+        }
+
+    @api.autovacuum
+    def _gc_old_results(self):
+        limit_date = fields.Datetime.now() - timedelta(days=RESULT_RETENTION_DAYS)
+        self.search([('create_date', '<', limit_date)]).unlink()
+
+
+class HrHospitalDiseaseReportResultLine(models.Model):
+    _name = 'hr.hospital.disease.report.result.line'
+    _description = 'Disease Report Result Line'
+    _order = 'sequence, id'
+    _log_access = False
+
+    result_id = fields.Many2one(
+        'hr.hospital.disease.report.result',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+    sequence = fields.Integer(default=10)
+    label = fields.Char(readonly=True)
+    count = fields.Integer(readonly=True)
+    breakdown = fields.Json(readonly=True)
+    breakdown_display = fields.Char(
+        string='Breakdown',
+        compute='_compute_breakdown_display'
+    )
+
+    @api.depends('breakdown')
+    def _compute_breakdown_display(self):
+        for line in self:
+            line.breakdown_display = ', '.join(
+                f'{label}: {count}' for label, count in (line.breakdown or {}).items()
+            )
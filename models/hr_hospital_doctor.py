@@ -9,9 +9,17 @@ from odoo import _
 class HrHospitalDoctor(models.Model):
     _name = 'hr.hospital.doctor'
     _description = 'Doctor'
-    _inherit = ['abstract.person']
+    _inherit = ['abstract.person', 'hr.hospital.counter.mixin']
     _order = 'last_name, first_name'
 
+    _counter_fields = {
+        'active_patients_count': ('patient_ids', []),
+        'upcoming_visits_count': ('visit_ids', lambda self: [
+            ('state', 'in', ['planned', 'in_progress']),
+            ('planned_datetime', '>', datetime.now()),
+        ]),
+    }
+
     # System User
     user_id = fields.Many2one(
         'res.users',
@@ -122,6 +130,14 @@ class HrHospitalDoctor(models.Model):
          'The rating must be between 0.00 and 5.00'),
     ]
 
+    def init(self):
+        super(HrHospitalDoctor, self).init()
+        # License anniversaries by (month, day), used by the experience refresh
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS idx_doctor_license_anniversary ON hr_hospital_doctor
+                   ((EXTRACT(MONTH FROM license_date)), (EXTRACT(DAY FROM license_date)))
+        """)
+
     # Experience computation
     @api.depends('license_date')
     def _compute_experience(self):
@@ -135,22 +151,50 @@ class HrHospitalDoctor(models.Model):
             else:
                 record.experience = 0
 
+    @api.model
+    def _cron_refresh_experience(self):
+        """Recompute experience only for the licenses whose anniversary passed since the last run"""
+        days = self._get_pending_refresh_days('hr_hospital.experience_last_refresh')
+        self._recompute_stored_field('experience', self._search_anniversaries('license_date', days))
+        self.env['ir.config_parameter'].sudo().set_param(
+            'hr_hospital.experience_last_refresh', fields.Date.to_string(date.today())
+        )
+
     # Active patients computation
     @api.depends('patient_ids')
     def _compute_active_patients_count(self):
-        for doctor in self:
-            doctor.active_patients_count = len(doctor.patient_ids)
+        self._compute_counter('active_patients_count')
 
     # Upcoming visits computation
     @api.depends('visit_ids', 'visit_ids.planned_datetime', 'visit_ids.state')
     def _compute_upcoming_visits_count(self):
-        for doctor in self:
-            today = datetime.now()
-            upcoming = doctor.visit_ids.filtered(
-                lambda v: v.planned_datetime and v.planned_datetime > today
-                          and v.state in ['planned', 'in_progress']
-            )
-            doctor.upcoming_visits_count = len(upcoming)
+        self._compute_counter('upcoming_visits_count')
+
+    @api.model
+    def _cron_refresh_upcoming_visits_count(self):
+        """Recompute upcoming_visits_count of the doctors whose visits became past
+
+        Only visits planned between the previous run and now can have left the
+        upcoming window, so only their doctors are recomputed.
+        """
+        params = self.env['ir.config_parameter'].sudo()
+        now = datetime.now()
+        last_run = params.get_param('hr_hospital.upcoming_visits_last_refresh')
+
+        if last_run:
+            groups = self.env['hr.hospital.visit']._read_group([
+                ('state', 'in', ['planned', 'in_progress']),
+                ('planned_datetime', '>', fields.Datetime.to_datetime(last_run)),
+                ('planned_datetime', '<=', now),
+            ], ['doctor_id'])
+            doctors = self.browse([doctor.id for doctor, in groups])
+        else:
+            doctors = self.search([('upcoming_visits_count', '>', 0)])
+
+        if doctors:
+            self.env.add_to_compute(self._fields['upcoming_visits_count'], doctors)
+            doctors.flush_recordset(['upcoming_visits_count'])
+        params.set_param('hr_hospital.upcoming_visits_last_refresh', fields.Datetime.to_string(now))
 
     # Display name computation for Odoo 19.0
     @api.depends('full_name', 'speciality_id')
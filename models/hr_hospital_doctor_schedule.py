@@ -1,7 +1,31 @@
 # -*- coding: utf-8 -*-
+from collections import defaultdict
+
 from odoo import models, fields, api
 from odoo.exceptions import ValidationError
 
+from .hr_hospital_cache import invalidate_doctor_slots
+
+ABSENCE_TYPES = ('vacation', 'sick_leave', 'conference')
+
+
+def subtract_intervals(intervals, removed):
+    """Return the parts of sorted (start, end) intervals not covered by removed"""
+    result = []
+    removed = sorted(removed)
+    for start, end in intervals:
+        for cut_start, cut_end in removed:
+            if cut_end <= start or cut_start >= end:
+                continue
+            if cut_start > start:
+                result.append((start, cut_start))
+            start = max(start, cut_end)
+            if start >= end:
+                break
+        if start < end:
+            result.append((start, end))
+    return result
+
 
 class HrHospitalDoctorSchedule(models.Model):
     _name = 'hr.hospital.doctor.schedule'
@@ -66,6 +90,23 @@ class HrHospitalDoctorSchedule(models.Model):
          'End time must be later than start time!'),
     ]
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        schedules = super(HrHospitalDoctorSchedule, self).create(vals_list)
+        invalidate_doctor_slots(self.env, schedules.doctor_id.ids)
+        return schedules
+
+    def write(self, vals):
+        doctor_ids = set(self.doctor_id.ids)
+        if vals.get('doctor_id'):
+            doctor_ids.add(vals['doctor_id'])
+        invalidate_doctor_slots(self.env, doctor_ids)
+        return super(HrHospitalDoctorSchedule, self).write(vals)
+
+    def unlink(self):
+        invalidate_doctor_slots(self.env, self.doctor_id.ids)
+        return super(HrHospitalDoctorSchedule, self).unlink()
+
     @api.depends('start_time', 'end_time')
     def _compute_duration(self):
         for record in self:
@@ -83,4 +124,47 @@ class HrHospitalDoctorSchedule(models.Model):
             if record.start_time < 0 or record.start_time > 24:
                 raise ValidationError('Start time must be between 0 and 24 hours.')
             if record.end_time < 0 or record.end_time > 24:
-                raise ValidationError('End time must be between 0 and 24 hours.')
\ No newline at end of file
+                raise ValidationError('End time must be between 0 and 24 hours.')
+
+    @api.model
+    def _get_intervals_map(self, doctor_ids, dates, schedule_types=('work',)):
+        """Map (doctor_id, date) to {schedule_type: [(start_time, end_time), ...]}
+
+        All rows are loaded with a single read. Rows for a specific date take
+        precedence over the recurring weekly rows of the same type.
+        """
+        doctor_ids = list(set(doctor_ids))
+        dates = sorted(set(dates))
+        if not doctor_ids or not dates:
+            return {}
+
+        weekdays = list({str(day.weekday()) for day in dates})
+        rows = self.search_read([
+            ('doctor_id', 'in', doctor_ids),
+            ('schedule_type', 'in', list(schedule_types)),
+            '|',
+            ('specific_date', 'in', dates),
+            '&', ('specific_date', '=', False), ('day_of_week', 'in', weekdays),
+        ], ['doctor_id', 'day_of_week', 'specific_date', 'start_time', 'end_time', 'schedule_type'], load=False)
+
+        dated = defaultdict(list)
+        weekly = defaultdict(list)
+        for row in rows:
+            interval = (row['start_time'], row['end_time'])
+            if row['specific_date']:
+                dated[(row['doctor_id'], row['specific_date'], row['schedule_type'])].append(interval)
+            else:
+                weekly[(row['doctor_id'], row['day_of_week'], row['schedule_type'])].append(interval)
+
+        result = {}
+        for doctor_id in doctor_ids:
+            for day in dates:
+                day_map = {}
+                for schedule_type in schedule_types:
+                    intervals = (dated.get((doctor_id, day, schedule_type))
+                                 or weekly.get((doctor_id, str(day.weekday()), schedule_type)))
+                    if intervals:
+                        day_map[schedule_type] = sorted(intervals)
+                if day_map:
+                    result[(doctor_id, day)] = day_map
+        return result
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api
+
+
+class HrHospitalDoctorSlotStamp(models.Model):
+    _name = 'hr.hospital.doctor.slot.stamp'
+    _description = 'Doctor Availability Change Stamp'
+    _log_access = False
+
+    # One row is inserted per doctor whenever their visits or schedule change.
+    # Rows are only ever inserted, so concurrent bookings never wait on each
+    # other, and a new row only becomes visible when its transaction commits.
+    doctor_id = fields.Many2one('hr.hospital.doctor', required=True, index=True, ondelete='cascade')
+
+    @api.model
+    def _bump(self, doctor_ids):
+        """Mark the availability of the given doctors as changed"""
+        doctor_ids = sorted(set(doctor_ids))
+        if doctor_ids:
+            self.env.cr.execute("""
+                INSERT INTO hr_hospital_doctor_slot_stamp (doctor_id)
+                SELECT unnest(%s::int[])
+            """, [doctor_ids])
+
+    @api.model
+    def _get_versions(self, doctor_ids):
+        """Map each doctor to a version that changes with every committed stamp
+
+        The row count is part of the version: a stamp committed after a
+        newer one does not raise the highest id, but it does raise the count.
+        """
+        versions = dict.fromkeys(doctor_ids, (0, 0))
+        self.env.cr.execute("""
+            SELECT doctor_id, MAX(id), COUNT(*)
+              FROM hr_hospital_doctor_slot_stamp
+             WHERE doctor_id = ANY(%s)
+          GROUP BY doctor_id
+        """, [list(doctor_ids)])
+        for doctor_id, last_id, total in self.env.cr.fetchall():
+            versions[doctor_id] = (last_id, total)
+        return versions
+
+    @api.autovacuum
+    def _gc_old_stamps(self):
+        """Keep only the latest stamp of each doctor"""
+        self.env.cr.execute("""
+            DELETE FROM hr_hospital_doctor_slot_stamp stamp
+             WHERE EXISTS (
+                    SELECT 1
+                      FROM hr_hospital_doctor_slot_stamp newer
+                     WHERE newer.doctor_id = stamp.doctor_id
+                       AND newer.id > stamp.id
+                   )
+        """)
@@ -6,6 +6,11 @@ class HrHospitalDoctorSpeciality(models.Model):
     _name = 'hr.hospital.doctor.speciality'
     _description = 'Doctor Specialty'
     _order = 'name'
+    _inherit = ['hr.hospital.counter.mixin']
+
+    _counter_fields = {
+        'doctors_count': ('doctor_ids', []),
+    }
 
     name = fields.Char(
         string='Name',
@@ -47,8 +52,7 @@ class HrHospitalDoctorSpeciality(models.Model):
 
     @api.depends('doctor_ids')
     def _compute_doctors_count(self):
-        for speciality in self:
-            speciality.doctors_count = len(speciality.doctor_ids)
+        self._compute_counter('doctors_count')
 
     def name_get(self):
         result = []
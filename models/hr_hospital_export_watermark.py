@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+import json
+from datetime import datetime, timedelta
+
+from odoo import models, fields, api
+
+# Models followed by the change export
+EXPORT_MODELS = (
+    'hr.hospital.patient',
+    'hr.hospital.visit',
+    'hr.hospital.diagnosis',
+    'hr.hospital.patient.doctor.history',
+)
+
+# Values derived from dates and today's date, refreshed daily without touching
+# write_date; consumers derive them from the exported dates instead
+EXPORT_EXCLUDED_FIELDS = {
+    'hr.hospital.patient': {'age'},
+    'hr.hospital.visit': {'patient_age'},
+    'hr.hospital.patient.doctor.history': {'assignment_duration'},
+}
+
+# Rows written per NDJSON chunk
+EXPORT_CHUNK_SIZE = 5000
+
+# Every run re-scans this far back from its watermarks. write_date and
+# deleted_at are set while their transaction runs, so a transaction committing
+# after a run can still add rows older than the watermark of that run. The
+# overlap must exceed the longest transaction (limit_time_real and
+# limit_time_real_cron); rows of the overlap are exported again, which the
+# upserts and deletes of the consumer absorb.
+EXPORT_OVERLAP = timedelta(hours=2)
+
+# NDJSON chunks are removed by the autovacuum once the consumer had this long to fetch them
+EXPORT_RETENTION_DAYS = 7
+
+
+class HrHospitalExportWatermark(models.Model):
+    _name = 'hr.hospital.export.watermark'
+    _description = 'Change Export Watermark'
+    _order = 'model_name'
+
+    model_name = fields.Char(required=True, readonly=True, index=True)
+    last_write_date = fields.Datetime(readonly=True, help='write_date of the last exported row')
+    last_tombstone_date = fields.Datetime(readonly=True, help='Deletion date of the last exported tombstone')
+    last_run = fields.Datetime(readonly=True)
+
+    _sql_constraints = [
+        ('model_name_unique', 'UNIQUE(model_name)', 'Each model can only have one export watermark.'),
+    ]
+
+    def _get_export_fields(self):
+        """Stored columns of the model, relations exported as ids, day-dependent values left out"""
+        Model = self.env[self.model_name]
+        excluded = EXPORT_EXCLUDED_FIELDS.get(self.model_name, set())
+        return [
+            name for name, field in Model._fields.items()
+            if field.store and field.type not in ('one2many', 'many2many', 'binary') and name not in excluded
+        ]
+
+    def _create_chunk(self, lines, chunk_index):
+        stamp = self.last_run.strftime('%Y%m%d%H%M%S')
+        return self.env['ir.attachment'].create({
+            'name': f"{self.model_name.replace('.', '_')}_{stamp}_{chunk_index:04d}.ndjson",
+            'raw': ''.join(lines).encode('utf-8'),
+            'mimetype': 'application/x-ndjson',
+            'res_model': self._name,
+            'res_id': self.id,
+        })
+
+    def _get_scan_start(self, watermark):
+        """Keyset position where a run starts: the watermark minus the overlap"""
+        return (watermark - EXPORT_OVERLAP if watermark else datetime.min, 0)
+
+    def _export_changes(self, upper_bound):
+        """Write the rows changed or deleted since the watermark as NDJSON attachments
+
+        Rows are walked in (write_date, id) order from the watermark minus the
+        overlap, and the watermark moves forward after every chunk.
+        """
+        self.ensure_one()
+        Model = self.env[self.model_name].with_context(active_test=False)
+        Model.flush_model()
+        field_names = self._get_export_fields()
+        attachments = self.env['ir.attachment']
+        self.last_run = fields.Datetime.now()
+
+        position = self._get_scan_start(self.last_write_date)
+        while True:
+            self.env.cr.execute(f"""
+                SELECT id, write_date
+                  FROM {Model._table}
+                 WHERE (write_date, id) > (%s, %s)
+                   AND write_date <= %s
+              ORDER BY write_date, id
+                 LIMIT %s
+            """, [position[0], position[1], upper_bound, EXPORT_CHUNK_SIZE])
+            keys = self.env.cr.fetchall()
+            if not keys:
+                break
+            rows = Model.browse([record_id for record_id, _write_date in keys]).read(field_names, load=False)
+            lines = [json.dumps(dict(row, _op='upsert'), default=str, ensure_ascii=False) + '\n' for row in rows]
+            attachments |= self._create_chunk(lines, len(attachments))
+            last_id, last_write_date = keys[-1]
+            position = (last_write_date, last_id)
+            if not self.last_write_date or position[0] > self.last_write_date:
+                self.last_write_date = position[0]
+            Model.invalidate_model()
+
+        Tombstone = self.env['hr.hospital.export.tombstone']
+        Tombstone.flush_model()
+        position = self._get_scan_start(self.last_tombstone_date)
+        while True:
+            self.env.cr.execute("""
+                SELECT id, res_id, deleted_at
+                  FROM hr_hospital_export_tombstone
+                 WHERE model_name = %s
+                   AND (deleted_at, id) > (%s, %s)
+                   AND deleted_at <= %s
+              ORDER BY deleted_at, id
+                 LIMIT %s
+            """, [self.model_name, position[0], position[1], upper_bound, EXPORT_CHUNK_SIZE])
+            tombstones = self.env.cr.fetchall()
+            if not tombstones:
+                break
+            lines = [json.dumps({
+                'id': res_id,
+                'deleted_at': str(deleted_at),
+                '_op': 'delete',
+            }) + '\n' for _tombstone_id, res_id, deleted_at in tombstones]
+            attachments |= self._create_chunk(lines, len(attachments))
+            position = (tombstones[-1][2], tombstones[-1][0])
+            if not self.last_tombstone_date or position[0] > self.last_tombstone_date:
+                self.last_tombstone_date = position[0]
+        return attachments
+
+    @api.model
+    def run_export(self):
+        """Export the changes of every followed model since its watermark
+
+        Returns the ids of the NDJSON attachments written by this run.
+        """
+        existing = set(self.search([]).mapped('model_name'))
+        self.create([{'model_name': model_name} for model_name in EXPORT_MODELS if model_name not in existing])
+
+        upper_bound = fields.Datetime.now()
+        attachments = self.env['ir.attachment']
+        for watermark in self.search([('model_name', 'in', EXPORT_MODELS)]):
+            attachments |= watermark._export_changes(upper_bound)
+        return attachments.ids
+
+    @api.model
+    def _cron_export_changes(self):
+        self.run_export()
+
+    @api.autovacuum
+    def _gc_exported_tombstones(self):
+        """Drop the tombstones older than the overlap their watermark re-scans"""
+        self.flush_model(['model_name', 'last_tombstone_date'])
+        self.env.cr.execute("""
+            DELETE FROM hr_hospital_export_tombstone tombstone
+             USING hr_hospital_export_watermark watermark
+             WHERE tombstone.model_name = watermark.model_name
+               AND tombstone.deleted_at < watermark.last_tombstone_date - %s
+        """, [EXPORT_OVERLAP])
+
+    @api.autovacuum
+    def _gc_export_chunks(self):
+        """Drop the NDJSON chunks older than the retention period"""
+        limit_date = fields.Datetime.now() - timedelta(days=EXPORT_RETENTION_DAYS)
+        self.env['ir.attachment'].search([
+            ('res_model', '=', self._name),
+            ('create_date', '<', limit_date),
+        ]).unlink()
+
+
+class HrHospitalExportTombstone(models.Model):
+    _name = 'hr.hospital.export.tombstone'
+    _description = 'Change Export Tombstone'
+    _order = 'id'
+    _log_access = False
+
+    model_name = fields.Char(required=True, readonly=True, index=True)
+    res_id = fields.Integer(required=True, readonly=True)
+    deleted_at = fields.Datetime(required=True, readonly=True, index=True, default=fields.Datetime.now)
+
+    @api.model
+    def _record(self, records):
+        """Remember deleted records, so the change export can emit their deletion"""
+        if records:
+            self.sudo().create([{'model_name': records._name, 'res_id': record_id} for record_id in records.ids])
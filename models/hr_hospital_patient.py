@@ -81,13 +81,13 @@ class HrHospitalPatient(models.Model):
     # Computed Fields
     last_visit_date = fields.Datetime(
         string='Last Visit Date',
-        compute='_compute_last_visit',
+        compute='_compute_visit_stats',
         store=True
     )
 
     total_visits = fields.Integer(
         string='Total Visits',
-        compute='_compute_total_visits',
+        compute='_compute_visit_stats',
         store=True
     )
 
@@ -115,19 +115,31 @@ class HrHospitalPatient(models.Model):
     #                     'Please choose a different doctor.'
     #                 )
 
-    # Last visit computation
+    # Last visit and total visits computation
     @api.depends('visit_ids', 'visit_ids.planned_datetime', 'visit_ids.state')
-    def _compute_last_visit(self):
-        for patient in self:
-            visits = patient.visit_ids.filtered(
-                lambda v: v.state == 'completed'
-            ).sorted(key='planned_datetime', reverse=True)
-            patient.last_visit_date = visits[0].planned_datetime if visits else False
-
-    # Total visits computation
-    @api.depends('visit_ids')
-    def _compute_total_visits(self):
-        for patient in self:
+    def _compute_visit_stats(self):
+        patients = self.filtered('id')
+        stats = {}
+        if patients:
+            # One aggregate query for the whole batch instead of loading every visit
+            self.env['hr.hospital.visit'].flush_model(['patient_id', 'planned_datetime', 'state'])
+            self.env.cr.execute("""
+                SELECT patient_id,
+                       MAX(planned_datetime) FILTER (WHERE state = 'completed'),
+                       COUNT(*)
+                  FROM hr_hospital_visit
+                 WHERE patient_id = ANY(%s)
+              GROUP BY patient_id
+            """, [patients.ids])
+            stats = {patient_id: (last_visit, total) for patient_id, last_visit, total in self.env.cr.fetchall()}
+
+        for patient in patients:
+            patient.last_visit_date, patient.total_visits = stats.get(patient.id, (False, 0))
+
+        # New records (onchange) have no rows in the database yet
+        for patient in self - patients:
+            completed = patient.visit_ids.filtered(lambda v: v.state == 'completed')
+            patient.last_visit_date = max(completed.mapped('planned_datetime'), default=False)
             patient.total_visits = len(patient.visit_ids)
 
     # Display name computation for Odoo 19.0
@@ -207,38 +219,40 @@ class HrHospitalPatient(models.Model):
 
     # Override write to create history
     def write(self, vals):
-        if 'personal_doctor_id' in vals:
-            # Create a history record for each patient in self
-            for patient in self:
-                old_doctor_id = patient.personal_doctor_id.id if patient.personal_doctor_id else False
-                new_doctor_id = vals.get('personal_doctor_id')
-
-                # Convert string to int if needed
-                if isinstance(new_doctor_id, str) and new_doctor_id.isdigit():
-                    new_doctor_id = int(new_doctor_id)
-
-                if old_doctor_id != new_doctor_id and new_doctor_id:
-                    # Deactivate previous active records
-                    active_history = self.env['hr.hospital.patient.doctor.history'].search([
-                        ('patient_id', '=', patient.id),
-                        ('active', '=', True)
-                    ])
-                    if active_history:
-                        active_history.write({
-                            'active': False,
-                            'change_date': date.today(),
-                            'change_reason': 'Automatically deactivated due to doctor change'
-                        })
-
-                    # Create new history record
-                    self.env['hr.hospital.patient.doctor.history'].create({
-                        'patient_id': patient.id,
-                        'doctor_id': new_doctor_id,
-                        'assignment_date': date.today(),
-                        'active': True
-                    })
-
-        return super(HrHospitalPatient, self).write(vals)
+        if 'personal_doctor_id' in vals and not self.env.context.get('skip_doctor_history'):
+            self._update_doctor_history(vals['personal_doctor_id'])
+
+        if 'country_id' not in vals:
+            return super(HrHospitalPatient, self).write(vals)
+        # Diagnoses are rolled up by patient country
+        rollup = self.env['hr.hospital.diagnosis.daily']
+        rollup._apply_deltas('patient_id', self.ids, -1)
+        res = super(HrHospitalPatient, self).write(vals)
+        rollup._apply_deltas('patient_id', self.ids, 1)
+        return res
+
+    def _update_doctor_history(self, new_doctor_id):
+        """Close the open history of the patients changing doctor and open a new one
+
+        One multi-create, whatever the number of patients: the history create
+        deactivates the previous rows of all these patients at once.
+        """
+        # Convert string to int if needed
+        if isinstance(new_doctor_id, str) and new_doctor_id.isdigit():
+            new_doctor_id = int(new_doctor_id)
+        if not new_doctor_id:
+            return
+
+        patients = self.filtered(lambda p: p.personal_doctor_id.id != new_doctor_id)
+        if not patients:
+            return
+
+        self.env['hr.hospital.patient.doctor.history'].create([{
+            'patient_id': patient.id,
+            'doctor_id': new_doctor_id,
+            'assignment_date': date.today(),
+            'active': True
+        } for patient in patients])
 
     # Override unlink to prevent deletion with active visits
     def unlink(self):
@@ -251,6 +265,10 @@ class HrHospitalPatient(models.Model):
                     'Cannot delete a patient with active visits. '
                     'Please complete or cancel all visits first.'
                 )
+        # The history rows go with the patient through the database cascade
+        tombstones = self.env['hr.hospital.export.tombstone']
+        tombstones._record(self.with_context(active_test=False).doctor_history_ids)
+        tombstones._record(self)
         return super(HrHospitalPatient, self).unlink()
 
     @api.model
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+import io
+import logging
+import os
+import threading
+import zipfile
+
+from odoo import models, fields, api, _
+from odoo.tools import config
+from odoo.tools.safe_eval import safe_eval
+
+_logger = logging.getLogger(__name__)
+
+# Patients whose cards are collected and written per chunk
+EXPORT_JOB_CHUNK_SIZE = 500
+
+# Models read by the card collectors, evicted from the cache after each chunk
+CARD_MODELS = (
+    'hr.hospital.patient',
+    'hr.hospital.visit',
+    'hr.hospital.diagnosis',
+    'hr.hospital.patient.doctor.history',
+)
+
+
+class HrHospitalPatientCardExportJob(models.Model):
+    _name = 'hr.hospital.patient.card.export.job'
+    _description = 'Patient Medical Card Bulk Export'
+    _inherit = ['mail.thread']
+    _order = 'create_date desc, id desc'
+
+    name = fields.Char(required=True, readonly=True)
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed')
+    ], default='pending', required=True, readonly=True, tracking=True)
+
+    # Export scope and options, copied from the export wizard
+    patient_domain = fields.Char(default='[]', required=True, readonly=True)
+    start_date = fields.Date(readonly=True)
+    end_date = fields.Date(readonly=True)
+    include_diagnoses = fields.Boolean(readonly=True)
+    include_recommendations = fields.Boolean(readonly=True)
+    lang_id = fields.Many2one('res.lang', readonly=True)
+    export_format = fields.Selection([
+        ('json', 'JSON'),
+        ('csv', 'CSV')
+    ], default='json', required=True, readonly=True)
+
+    # Progress and result
+    total_count = fields.Integer(string='Patients', readonly=True)
+    processed_count = fields.Integer(string='Exported Patients', readonly=True)
+    last_patient_id = fields.Integer(
+        readonly=True,
+        help='Id of the last exported patient, where an interrupted job resumes'
+    )
+    attachment_id = fields.Many2one('ir.attachment', string='Archive', readonly=True, ondelete='set null')
+    error_message = fields.Text(readonly=True)
+
+    def _get_export_wizard(self):
+        """Virtual export wizard carrying the options of the job"""
+        self.ensure_one()
+        wizard = self.env['hr.hospital.patient.card.export.wizard']
+        if self.lang_id:
+            wizard = wizard.with_context(lang=self.lang_id.code)
+        return wizard.new({
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'include_diagnoses': self.include_diagnoses,
+            'include_recommendations': self.include_recommendations,
+            'lang_id': self.lang_id.id,
+            'export_format': self.export_format,
+        })
+
+    def _get_work_path(self):
+        """Archive being built, kept in the filestore so an interrupted job can resume"""
+        self.ensure_one()
+        directory = os.path.join(config.filestore(self.env.cr.dbname), 'hr_hospital_card_exports')
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f'job_{self.id}.zip')
+
+    def _commit_progress(self):
+        # Tests run inside a single transaction that must not be committed
+        if not getattr(threading.current_thread(), 'testing', False):
+            self.env.cr.commit()
+
+    def _write_chunk(self, path, patients):
+        """Append the cards of patients to the archive, skipping those already in it"""
+        self.ensure_one()
+        wizard = self._get_export_wizard()
+        with zipfile.ZipFile(path, 'a', compression=zipfile.ZIP_DEFLATED) as archive:
+            # Cards written before an interruption are not written twice
+            existing = set(archive.namelist())
+            cards = wizard._collect_cards(patients)
+            for patient_id, card in cards.items():
+                file_name = wizard._get_card_file_name(card['patient']['full_name'], patient_id)
+                if file_name in existing:
+                    continue
+                # Stream the card straight into its compressed archive entry
+                with io.TextIOWrapper(archive.open(file_name, 'w'), encoding='utf-8', newline='') as output:
+                    wizard._write_card(card, output)
+
+    def _start(self, path):
+        """Mark the job running, starting over unless a valid partial archive is left to resume"""
+        self.ensure_one()
+        if self.state == 'running' and self.last_patient_id and zipfile.is_zipfile(path):
+            return
+        if os.path.exists(path):
+            os.unlink(path)
+        domain = safe_eval(self.patient_domain)
+        self.write({
+            'state': 'running',
+            'total_count': self.env['hr.hospital.patient'].with_user(self.create_uid).search_count(domain),
+            'processed_count': 0,
+            'last_patient_id': 0,
+            'error_message': False,
+        })
+
+    def _process(self):
+        """Build the archive of the job, committing the progress after each chunk of patients
+
+        The job is marked running and committed first. A job interrupted by a
+        worker timeout or restart stays running and resumes after its last
+        committed chunk on the next run.
+        """
+        self.ensure_one()
+        path = self._get_work_path()
+        self._start(path)
+        self._commit_progress()
+
+        # Read the patients with the rights of the user who asked for the export
+        job = self.with_user(self.create_uid)
+        Patient = self.env['hr.hospital.patient'].with_user(self.create_uid)
+        domain = safe_eval(self.patient_domain)
+        try:
+            while True:
+                with self.env.cr.savepoint():
+                    patients = Patient.search(
+                        domain + [('id', '>', self.last_patient_id)], order='id', limit=EXPORT_JOB_CHUNK_SIZE
+                    )
+                    if not patients:
+                        break
+                    job._write_chunk(path, patients)
+                    self.write({
+                        'processed_count': self.processed_count + len(patients),
+                        'last_patient_id': patients[-1].id,
+                    })
+                self._commit_progress()
+                # Keep memory flat: drop the records of this chunk from the cache
+                for model_name in CARD_MODELS:
+                    self.env[model_name].invalidate_model()
+
+            if not os.path.exists(path):
+                # No patient left in scope: hand out an empty archive
+                zipfile.ZipFile(path, 'w').close()
+            with self.env.cr.savepoint():
+                attachment = self.env['ir.attachment']._create_from_file(path, {
+                    'name': f'{self.name}.zip',
+                    'mimetype': 'application/zip',
+                    'res_model': self._name,
+                    'res_id': self.id,
+                })
+        except Exception as error:
+            _logger.exception('Patient card export job %s failed', self.id)
+            self.write({'state': 'failed', 'error_message': str(error)})
+            self.message_post(
+                body=_('The medical card export failed: %s', error),
+                partner_ids=self.create_uid.partner_id.ids,
+            )
+            if os.path.exists(path):
+                os.unlink(path)
+            return
+
+        self.write({'state': 'done', 'attachment_id': attachment.id})
+        self.message_post(
+            body=_('The medical cards of %s patients are ready.', self.processed_count),
+            attachment_ids=attachment.ids,
+            partner_ids=self.create_uid.partner_id.ids,
+        )
+        os.unlink(path)
+
+    @api.model
+    def _cron_process_jobs(self):
+        """Process the oldest unfinished bulk export, then run again while others wait"""
+        domain = [('state', 'in', ('running', 'pending'))]
+        job = self.search(domain, order='id', limit=1)
+        if not job:
+            return
+        job._process()
+        if self.search_count(domain, limit=1):
+            self.env.ref('hr_hospital.ir_cron_process_patient_card_export_jobs')._trigger()
+
+    def action_retry(self):
+        # Users cannot write their jobs, the record rules already limit self to their own
+        self.filtered(lambda job: job.state == 'failed').sudo().write({'state': 'pending'})
+        self.env.ref('hr_hospital.ir_cron_process_patient_card_export_jobs')._trigger()
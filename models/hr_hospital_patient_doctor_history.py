@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from odoo import models, fields, api
 from odoo.exceptions import ValidationError
+from collections import defaultdict
 from datetime import date
 
 
@@ -58,18 +59,59 @@ class HrHospitalPatientDoctorHistory(models.Model):
                 duration = (end_date - record.assignment_date).days
                 record.assignment_duration = max(0, duration)
 
-    # Override create
+    def init(self):
+        # Open assignments, the only rows the duration refresh touches
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS idx_doctor_history_open ON hr_hospital_patient_doctor_history
+                   (assignment_date) WHERE change_date IS NULL
+        """)
+
     @api.model
-    def create(self, vals):
-        # Deactivate previous active records for this patient
-        if vals.get('patient_id') and vals.get('active', True):
+    def _cron_refresh_assignment_duration(self):
+        """Bring the duration of open assignments up to date with one UPDATE
+
+        Only open assignments (without change date) grow every day; closed ones
+        are left untouched. The partial index on open assignments serves the scan.
+        write_date is left alone: the duration is derived from the dates, which
+        the change export ships instead.
+        """
+        self.flush_model(['assignment_date', 'change_date', 'assignment_duration'])
+        today = date.today()
+        self.env.cr.execute("""
+            UPDATE hr_hospital_patient_doctor_history
+               SET assignment_duration = GREATEST(0, %s - assignment_date)
+             WHERE change_date IS NULL
+               AND assignment_date IS NOT NULL
+               AND assignment_duration IS DISTINCT FROM GREATEST(0, %s - assignment_date)
+        """, [today, today])
+        self.invalidate_model(['assignment_duration'])
+
+    # Override create
+    @api.model_create_multi
+    def create(self, vals_list):
+        # Deactivate the previous active records of these patients, closed on
+        # the assignment date of the record replacing them
+        change_dates = {}
+        for vals in vals_list:
+            if vals.get('patient_id') and vals.get('active', True):
+                change_dates[vals['patient_id']] = fields.Date.to_date(vals.get('assignment_date')) or date.today()
+        if change_dates:
             previous_active = self.search([
-                ('patient_id', '=', vals['patient_id']),
+                ('patient_id', 'in', list(change_dates)),
                 ('active', '=', True)
             ])
-            previous_active.write({
-                'active': False,
-                'change_date': date.today()
-            })
+            by_change_date = defaultdict(lambda: self.browse())
+            for history in previous_active:
+                by_change_date[change_dates[history.patient_id.id]] |= history
+            for change_date, histories in by_change_date.items():
+                histories.write({
+                    'active': False,
+                    'change_date': change_date
+                })
+
+        return super(HrHospitalPatientDoctorHistory, self).create(vals_list)
 
-        return super(HrHospitalPatientDoctorHistory, self).create(vals)
\ No newline at end of file
+    # Override unlink
+    def unlink(self):
+        self.env['hr.hospital.export.tombstone']._record(self)
+        return super(HrHospitalPatientDoctorHistory, self).unlink()
\ No newline at end of file
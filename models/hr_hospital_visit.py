@@ -1,16 +1,44 @@
 # -*- coding: utf-8 -*-
-from datetime import datetime
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import psycopg2
 
 from odoo import models, fields, api
 from odoo.exceptions import ValidationError, UserError
 from odoo import _
 
+from .hr_hospital_cache import MISSING, invalidate_doctor_slots, slot_cache
+from .hr_hospital_doctor_schedule import ABSENCE_TYPES, subtract_intervals
+
+_logger = logging.getLogger(__name__)
+
+# Partial unique index enforcing one active visit per patient, doctor and day
+VISIT_UNIQUE_INDEX = 'idx_visit_patient_doctor_date_unique'
+
+# Number of weeks ahead kept in the per-doctor free slot cache
+SLOT_CACHE_WEEKS = 8
+
+# Context used for bulk inserts: no tracking values, log notes or followers
+BULK_CREATE_CONTEXT = {
+    'tracking_disable': True,
+    'mail_create_nolog': True,
+    'mail_create_nosubscribe': True,
+    'mail_notrack': True,
+}
+
 
 class HrHospitalVisit(models.Model):
     _name = 'hr.hospital.visit'
     _description = 'Patient Visit'
     _order = 'planned_datetime desc'
-    _inherit = ['mail.thread', 'mail.activity.mixin']  # Додано для відстеження змін
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'hr.hospital.counter.mixin']  # Додано для відстеження змін
+
+    _counter_fields = {
+        'diagnosis_count': ('diagnosis_ids', []),
+    }
 
     # Visit Status
     state = fields.Selection([
@@ -109,6 +137,34 @@ class HrHospitalVisit(models.Model):
          'Planned visit date cannot be in the past!'),
     ]
 
+    def init(self):
+        # Upcoming (planned / in progress) visits per doctor
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS idx_visit_upcoming ON hr_hospital_visit
+                   (doctor_id, planned_datetime) WHERE state IN ('planned', 'in_progress')
+        """)
+        # One active visit per patient, doctor and day (cancelled visits are ignored);
+        # it supersedes the plain index of earlier versions
+        self.env.cr.execute("DROP INDEX IF EXISTS idx_visit_patient_doctor_date")
+        self.env.cr.execute("""
+            SELECT 1
+              FROM hr_hospital_visit
+             WHERE state != 'cancelled'
+          GROUP BY patient_id, doctor_id, planned_datetime::date
+            HAVING COUNT(*) > 1
+             LIMIT 1
+        """)
+        if self.env.cr.fetchone():
+            _logger.warning(
+                'Duplicate active visits per patient, doctor and day exist; '
+                '%s is not created until they are resolved.', VISIT_UNIQUE_INDEX
+            )
+            return
+        self.env.cr.execute(f"""
+            CREATE UNIQUE INDEX IF NOT EXISTS {VISIT_UNIQUE_INDEX} ON hr_hospital_visit
+                   (patient_id, doctor_id, (planned_datetime::date)) WHERE state != 'cancelled'
+        """)
+
     # Constraints
     @api.constrains('planned_datetime')
     def _check_planned_datetime(self):
@@ -119,88 +175,118 @@ class HrHospitalVisit(models.Model):
                     _('Please select a future date and time.')
                 )
 
-    @api.constrains('doctor_id', 'patient_id', 'planned_datetime')
+    @contextmanager
+    def _raise_duplicate_visit(self):
+        """Report a violation of the unique visit index with the duplicate visit message
+
+        The index rejects the row at INSERT/UPDATE, before the Python
+        constraint below gets to run.
+        """
+        try:
+            with self.env.cr.savepoint(flush=False):
+                yield
+        except psycopg2.errors.UniqueViolation as error:
+            if error.diag.constraint_name != VISIT_UNIQUE_INDEX:
+                raise
+            raise ValidationError(
+                _('A patient can only have one visit to the same doctor per day.')
+            ) from None
+
+    # Same rule as the unique index, for databases where duplicates kept it from being created
+    @api.constrains('doctor_id', 'patient_id', 'planned_datetime', 'state')
     def _check_duplicate_visit(self):
-        for visit in self:
-            if visit.planned_datetime and visit.doctor_id and visit.patient_id:
-                # Check for duplicate visits on the same day
-                existing = self.search([
-                    ('id', '!=', visit.id),
-                    ('doctor_id', '=', visit.doctor_id.id),
-                    ('patient_id', '=', visit.patient_id.id),
-                    ('planned_datetime', '>=', visit.planned_datetime.replace(hour=0, minute=0, second=0)),
-                    ('planned_datetime', '<=', visit.planned_datetime.replace(hour=23, minute=59, second=59)),
-                    ('state', 'not in', ['cancelled'])
-                ])
-                if existing:
-                    raise ValidationError(
-                    _('A patient can only have one visit to the same doctor per day.')
-                )
+        visits = self.filtered(
+            lambda v: v.planned_datetime and v.doctor_id and v.patient_id and v.state != 'cancelled'
+        )
+        if not visits:
+            return
+        # One grouped query for the whole recordset: any (patient, doctor, day)
+        # touched by these visits that holds more than one active visit
+        self.flush_model(['doctor_id', 'patient_id', 'planned_datetime', 'state'])
+        self.env.cr.execute("""
+            SELECT patient_id, doctor_id, planned_datetime::date
+              FROM hr_hospital_visit
+             WHERE state != 'cancelled'
+               AND (patient_id, doctor_id, planned_datetime::date) IN (
+                       SELECT patient_id, doctor_id, planned_datetime::date
+                         FROM hr_hospital_visit
+                        WHERE id = ANY(%s)
+                   )
+          GROUP BY patient_id, doctor_id, planned_datetime::date
+            HAVING COUNT(*) > 1
+             LIMIT 1
+        """, [visits.ids])
+        if self.env.cr.fetchone():
+            raise ValidationError(
+                _('A patient can only have one visit to the same doctor per day.')
+            )
 
     @api.constrains('doctor_id', 'planned_datetime')
     def _check_doctor_schedule(self):
-        for visit in self:
-            if visit.doctor_id and visit.planned_datetime:
-                # Check if doctor has schedule for this date and time
-                weekday = str(visit.planned_datetime.weekday())
-                schedule = self.env['hr.hospital.doctor.schedule'].search([
-                    ('doctor_id', '=', visit.doctor_id.id),
-                    '|',
-                    ('date', '=', visit.planned_datetime.date()),
-                    ('day_of_week', '=', weekday),
-                    ('schedule_type', '=', 'work')
-                ], limit=1)
-
-                if not schedule:
-                    raise ValidationError(
-                        _('The selected doctor does not have a work schedule for this date and time.')
+        visits = self.filtered(lambda v: v.doctor_id and v.planned_datetime)
+        if not visits:
+            return
+
+        # Load the work schedule of every doctor/day in the recordset at once
+        intervals_map = self.env['hr.hospital.doctor.schedule']._get_intervals_map(
+            visits.doctor_id.ids,
+            {visit.planned_datetime.date() for visit in visits},
+        )
+
+        for visit in visits:
+            work = intervals_map.get(
+                (visit.doctor_id.id, visit.planned_datetime.date()), {}
+            ).get('work')
+            if not work:
+                raise ValidationError(
+                    _('The selected doctor does not have a work schedule for this date and time.')
                 )
 
-                # Check if within working hours
-                visit_hour = visit.planned_datetime.hour + visit.planned_datetime.minute / 60.0
-                if schedule.start_time and schedule.end_time:
-                    if visit_hour < schedule.start_time or visit_hour > schedule.end_time:
-                        raise ValidationError(
-                            f'The selected time is outside doctor\'s working hours '
-                            f'({schedule.start_time:.2f} - {schedule.end_time:.2f}).'
-                        )
+            # Check if within working hours
+            visit_hour = visit.planned_datetime.hour + visit.planned_datetime.minute / 60.0
+            if not any(start <= visit_hour <= end for start, end in work):
+                hours = ', '.join(f'{start:.2f} - {end:.2f}' for start, end in work)
+                raise ValidationError(
+                    _("The selected time is outside doctor's working hours (%s).", hours)
+                )
 
     # Actions
+    def _change_state(self, from_states, vals, message):
+        """Move the visits in from_states with one write and log one batch of notes
+
+        With the visit_state_summary context key, a single summary note listing
+        all the affected visits replaces the per-visit notes.
+        """
+        visits = self.filtered(lambda v: v.state in from_states)
+        if not visits:
+            return visits
+        visits.write(vals)
+        if self.env.context.get('visit_state_summary') and len(visits) > 1:
+            visits[:1]._message_log(
+                body=_('%(message)s: %(visits)s', message=message,
+                       visits=', '.join(visits.mapped('display_name')))
+            )
+        else:
+            visits._message_log_batch(bodies={visit.id: message for visit in visits})
+        return visits
+
     def action_start_visit(self):
-        for visit in self:
-            if visit.state == 'planned':
-                visit.write({
-                    'state': 'in_progress',
-                    'actual_datetime': datetime.now()
-                })
-                visit.message_post(body=_('Visit started'), subtype_xmlid='mail.mt_note')
+        self._change_state(['planned'], {
+            'state': 'in_progress',
+            'actual_datetime': datetime.now()
+        }, _('Visit started'))
         return True
 
     def action_complete_visit(self):
-        for visit in self:
-            if visit.state == 'in_progress':
-                visit.write({
-                    'state': 'completed'
-                })
-                visit.message_post(body=_('Visit completed'), subtype_xmlid='mail.mt_note')
+        self._change_state(['in_progress'], {'state': 'completed'}, _('Visit completed'))
         return True
 
     def action_cancel_visit(self):
-        for visit in self:
-            if visit.state in ['planned', 'in_progress']:
-                visit.write({
-                    'state': 'cancelled'
-                })
-                visit.message_post(body=_('Visit cancelled'), subtype_xmlid='mail.mt_note')
+        self._change_state(['planned', 'in_progress'], {'state': 'cancelled'}, _('Visit cancelled'))
         return True
 
     def action_mark_no_show(self):
-        for visit in self:
-            if visit.state == 'planned':
-                visit.write({
-                    'state': 'no_show'
-                })
-                visit.message_post(body=_('Patient did not show up'), subtype_xmlid='mail.mt_note')
+        self._change_state(['planned'], {'state': 'no_show'}, _('Patient did not show up'))
         return True
 
     # Computation methods
@@ -215,8 +301,7 @@ class HrHospitalVisit(models.Model):
 
     @api.depends('diagnosis_ids')
     def _compute_diagnosis_count(self):
-        for visit in self:
-            visit.diagnosis_count = len(visit.diagnosis_ids)
+        self._compute_counter('diagnosis_count')
 
     # Display name computation
     @api.depends('patient_id', 'doctor_id', 'planned_datetime')
@@ -227,6 +312,13 @@ class HrHospitalVisit(models.Model):
             else:
                 visit.display_name = f"Visit #{visit.id}"
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        with self._raise_duplicate_visit():
+            visits = super(HrHospitalVisit, self).create(vals_list)
+        invalidate_doctor_slots(self.env, visits.doctor_id.ids)
+        return visits
+
     # Override write to lock records
     def write(self, vals):
         for visit in self:
@@ -236,7 +328,21 @@ class HrHospitalVisit(models.Model):
                     raise UserError(
                         _('Cannot modify core details of a visit that is already completed, cancelled, or marked as no-show.')
                     )
-        return super(HrHospitalVisit, self).write(vals)
+        if {'doctor_id', 'planned_datetime', 'state'} & set(vals):
+            doctor_ids = set(self.doctor_id.ids)
+            if vals.get('doctor_id'):
+                doctor_ids.add(vals['doctor_id'])
+            invalidate_doctor_slots(self.env, doctor_ids)
+        if not {'doctor_id', 'patient_id'} & set(vals):
+            with self._raise_duplicate_visit():
+                return super(HrHospitalVisit, self).write(vals)
+        # Diagnoses are rolled up by doctor and patient country
+        rollup = self.env['hr.hospital.diagnosis.daily']
+        rollup._apply_deltas('visit_id', self.ids, -1)
+        with self._raise_duplicate_visit():
+            res = super(HrHospitalVisit, self).write(vals)
+        rollup._apply_deltas('visit_id', self.ids, 1)
+        return res
 
     # Override unlink
     def unlink(self):
@@ -246,6 +352,8 @@ class HrHospitalVisit(models.Model):
                     _('Cannot delete a visit that has linked diagnoses. ') +
                     _('Please delete the diagnoses first or cancel the visit.')
                 )
+        invalidate_doctor_slots(self.env, self.doctor_id.ids)
+        self.env['hr.hospital.export.tombstone']._record(self)
         return super(HrHospitalVisit, self).unlink()
 
     # Override default_get to set default values
@@ -258,46 +366,242 @@ class HrHospitalVisit(models.Model):
             res['planned_datetime'] = tomorrow.replace(hour=9, minute=0, second=0, microsecond=0)
         return res
 
+    @api.model
+    def _get_free_intervals(self, doctor_ids, start_date, end_date, slot_duration=0.5):
+        """Map (doctor_id, date) to the free (start_time, end_time) intervals
+
+        Work schedule minus absences (vacation, sick leave, conference) minus
+        already booked visits, computed with a fixed number of queries
+        regardless of the number of doctors and days.
+        """
+        doctor_ids = list(set(doctor_ids))
+        if not doctor_ids or start_date > end_date:
+            return {}
+        dates = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+
+        intervals_map = self.env['hr.hospital.doctor.schedule']._get_intervals_map(
+            doctor_ids, dates, schedule_types=('work',) + ABSENCE_TYPES
+        )
+
+        booked = defaultdict(list)
+        for visit in self.search_read([
+            ('doctor_id', 'in', doctor_ids),
+            ('state', 'in', ['planned', 'in_progress']),
+            ('planned_datetime', '>=', start_date),
+            ('planned_datetime', '<', end_date + timedelta(days=1)),
+        ], ['doctor_id', 'planned_datetime'], load=False):
+            planned = visit['planned_datetime']
+            hour = planned.hour + planned.minute / 60.0
+            booked[(visit['doctor_id'], planned.date())].append((hour, hour + slot_duration))
+
+        result = {}
+        for key, day_map in intervals_map.items():
+            work = day_map.get('work')
+            if not work:
+                continue
+            removed = list(booked.get(key, []))
+            for schedule_type in ABSENCE_TYPES:
+                removed += day_map.get(schedule_type, [])
+            free = subtract_intervals(work, removed)
+            if free:
+                result[key] = free
+        return result
+
+    @api.model
+    def _get_free_intervals_cached(self, doctor_ids, start_date, end_date, slot_duration=0.5):
+        """Same as _get_free_intervals, served from the per-doctor slot cache
+
+        Doctors missing from the cache, or whose stamp version moved since
+        their entry was built, are rebuilt together in one batch over the
+        whole cache horizon. Ranges outside the horizon bypass the cache.
+        Availability covers every visit, whatever the access rights of the
+        caller, so entries are built as superuser and shared by all users.
+        """
+        visits = self.sudo()
+        today = datetime.now().date()
+        horizon_end = today + timedelta(weeks=SLOT_CACHE_WEEKS)
+        if start_date < today or end_date > horizon_end:
+            return visits._get_free_intervals(doctor_ids, start_date, end_date, slot_duration)
+
+        dbname = self.env.cr.dbname
+        versions = self.env['hr.hospital.doctor.slot.stamp']._get_versions(set(doctor_ids))
+        per_doctor = {}
+        missing = []
+        for doctor_id, version in versions.items():
+            cached = slot_cache.get((dbname, doctor_id, today, slot_duration))
+            if cached is MISSING or cached[0] != version:
+                missing.append(doctor_id)
+            else:
+                per_doctor[doctor_id] = cached[1]
+
+        if missing:
+            built = {doctor_id: {} for doctor_id in missing}
+            for (doctor_id, day), intervals in visits._get_free_intervals(
+                    missing, today, horizon_end, slot_duration).items():
+                built[doctor_id][day] = tuple(intervals)
+            for doctor_id, days in built.items():
+                slot_cache.set((dbname, doctor_id, today, slot_duration), (versions[doctor_id], days))
+            per_doctor.update(built)
+
+        return {
+            (doctor_id, day): list(intervals)
+            for doctor_id, days in per_doctor.items()
+            for day, intervals in days.items()
+            if start_date <= day <= end_date
+        }
+
+    @api.model
+    def get_available_slots(self, doctor_ids, start_date=None, end_date=None, slot_duration=0.5):
+        """Get free visit slots for many doctors over a date range
+
+        Returns {doctor_id: [{'date', 'start_time', 'end_time'}, ...]} with
+        slots of slot_duration hours, ordered by date and time.
+        """
+        if not start_date:
+            start_date = datetime.now().date()
+        if not end_date:
+            end_date = start_date + timedelta(days=30)
+
+        result = {doctor_id: [] for doctor_id in doctor_ids}
+        free_intervals = self._get_free_intervals_cached(doctor_ids, start_date, end_date, slot_duration)
+        for (doctor_id, day), intervals in sorted(free_intervals.items()):
+            for start, end in intervals:
+                while start + slot_duration <= end:
+                    result[doctor_id].append({
+                        'date': day,
+                        'start_time': start,
+                        'end_time': start + slot_duration
+                    })
+                    start = round(start + slot_duration, 4)
+        return result
+
     @api.model
     def get_available_visit_dates(self, doctor_id, start_date=None, end_date=None):
-        """Get available visit dates excluding weekends and doctor's holidays"""
+        """Get free working intervals of a doctor, excluding absences and booked visits"""
         if not start_date:
             start_date = datetime.now().date()
         if not end_date:
             end_date = start_date + timedelta(days=30)
-            
-        doctor = self.env['hr.hospital.doctor'].browse(doctor_id)
-        if not doctor:
-            return []
-            
-        available_dates = []
-        current_date = start_date
-        
-        while current_date <= end_date:
-            # Skip weekends
-            if current_date.weekday() < 5:  # Monday to Friday
-                # Check if doctor has schedule for this day
-                weekday_str = str(current_date.weekday())
-                schedule = self.env['hr.hospital.doctor.schedule'].search([
-                    ('doctor_id', '=', doctor_id),
-                    ('day_of_week', '=', weekday_str),
-                    ('specific_date', '=', False)  # Regular weekly schedule
-                ], limit=1)
-                
-                if schedule:
-                    # Check if it's not a holiday
-                    is_holiday = self.env['hr.hospital.holiday'].search([
-                        ('doctor_id', '=', doctor_id),
-                        ('date', '=', current_date)
-                    ], limit=1)
-                    
-                    if not is_holiday:
-                        available_dates.append({
-                            'date': current_date,
-                            'start_time': schedule.start_time,
-                            'end_time': schedule.end_time
-                        })
-            
-            current_date += timedelta(days=1)
-            
-        return available_dates
+
+        free_intervals = self._get_free_intervals_cached([doctor_id], start_date, end_date)
+        return [{
+            'date': day,
+            'start_time': start,
+            'end_time': end
+        } for (_doctor_id, day), intervals in sorted(free_intervals.items()) for start, end in intervals]
+
+    @api.model
+    def _bulk_validate_visits(self, vals_list):
+        """Validate visit values set-wise, return {row index: [error messages]}"""
+        errors = defaultdict(list)
+        now = datetime.now()
+        rows = {}
+        for index, vals in enumerate(vals_list):
+            missing = [name for name in ('doctor_id', 'patient_id', 'planned_datetime', 'visit_type')
+                       if not vals.get(name)]
+            if missing:
+                errors[index].append(_('Missing required values: %s', ', '.join(missing)))
+                continue
+            planned = fields.Datetime.to_datetime(vals['planned_datetime'])
+            if planned < now:
+                errors[index].append(_('Planned visit date and time cannot be in the past.'))
+            rows[index] = (vals['doctor_id'], vals['patient_id'], planned)
+        if not rows:
+            return errors
+
+        # Doctors and patients: one query each
+        doctor_ids = {doctor_id for doctor_id, _patient_id, _planned in rows.values()}
+        valid_doctor_ids = set(self.env['hr.hospital.doctor'].search([
+            ('id', 'in', list(doctor_ids)),
+            ('license_number', '!=', False)
+        ]).ids)
+        patient_ids = {patient_id for _doctor_id, patient_id, _planned in rows.values()}
+        valid_patient_ids = set(self.env['hr.hospital.patient'].search([
+            ('id', 'in', list(patient_ids))
+        ]).ids)
+
+        # Work schedules: one read for every doctor and day of the batch
+        intervals_map = self.env['hr.hospital.doctor.schedule']._get_intervals_map(
+            valid_doctor_ids, {planned.date() for _doctor_id, _patient_id, planned in rows.values()}
+        )
+
+        # Duplicates against existing visits: one grouped query
+        self.flush_model(['doctor_id', 'patient_id', 'planned_datetime', 'state'])
+        keys = list(rows.values())
+        self.env.cr.execute("""
+            SELECT DISTINCT patient_id, doctor_id, planned_datetime::date
+              FROM hr_hospital_visit
+             WHERE state != 'cancelled'
+               AND (patient_id, doctor_id, planned_datetime::date) IN (
+                       SELECT * FROM unnest(%s::int[], %s::int[], %s::date[])
+                   )
+        """, [
+            [patient_id for _doctor_id, patient_id, _planned in keys],
+            [doctor_id for doctor_id, _patient_id, _planned in keys],
+            [planned.date() for _doctor_id, _patient_id, planned in keys],
+        ])
+        taken = set(self.env.cr.fetchall())
+
+        for index, (doctor_id, patient_id, planned) in rows.items():
+            if doctor_id not in valid_doctor_ids:
+                errors[index].append(_('Doctor %s does not exist or has no license.', doctor_id))
+                continue
+            if patient_id not in valid_patient_ids:
+                errors[index].append(_('Patient %s does not exist.', patient_id))
+                continue
+
+            work = intervals_map.get((doctor_id, planned.date()), {}).get('work')
+            visit_hour = planned.hour + planned.minute / 60.0
+            if not work:
+                errors[index].append(
+                    _('The selected doctor does not have a work schedule for this date and time.')
+                )
+            elif not any(start <= visit_hour <= end for start, end in work):
+                errors[index].append(_("The selected time is outside doctor's working hours."))
+
+            key = (patient_id, doctor_id, planned.date())
+            if key in taken:
+                errors[index].append(_('A patient can only have one visit to the same doctor per day.'))
+            elif not errors[index]:
+                # Later rows of the batch for the same day are duplicates
+                taken.add(key)
+
+        return {index: messages for index, messages in errors.items() if messages}
+
+    @api.model
+    def bulk_create_visits(self, vals_list, chunk_size=1000):
+        """Create many visits at once and report errors per row
+
+        Rows are validated set-wise and the valid ones are inserted in chunks
+        without tracking or chatter. A failing chunk is retried row by row, so
+        one bad row never aborts the whole batch.
+
+        Returns {'created_ids': [...], 'errors': [{'row': index, 'messages': [...]}]}
+        where index is the position of the row in vals_list.
+        """
+        errors = self._bulk_validate_visits(vals_list)
+        valid = [(index, vals) for index, vals in enumerate(vals_list) if index not in errors]
+
+        Visit = self.with_context(**BULK_CREATE_CONTEXT)
+        created_ids = []
+        for offset in range(0, len(valid), chunk_size):
+            chunk = valid[offset:offset + chunk_size]
+            try:
+                with self.env.cr.savepoint():
+                    created_ids += Visit.create([vals for _index, vals in chunk]).ids
+                continue
+            except (UserError, psycopg2.Error):
+                pass
+
+            # Isolate the offending rows of the chunk
+            for index, vals in chunk:
+                try:
+                    with self.env.cr.savepoint():
+                        created_ids += Visit.create(vals).ids
+                except (UserError, psycopg2.Error) as error:
+                    errors[index] = [str(error.args[0]) if error.args else str(error)]
+
+        return {
+            'created_ids': created_ids,
+            'errors': [{'row': index, 'messages': messages} for index, messages in sorted(errors.items())],
+        }
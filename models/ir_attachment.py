@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import mmap
+import os
+
+from odoo import models, api
+
+
+class IrAttachment(models.Model):
+    _inherit = 'ir.attachment'
+
+    @api.model
+    def _create_from_file(self, path, vals):
+        """Create an attachment holding the content of a local file, without loading it in memory
+
+        With the filestore, the file is memory-mapped and handed to
+        _file_write(), so the usual path layout, collision check, garbage
+        collection and storage overrides all apply while the kernel pages the
+        content in and out. The attachment gets no raw value, so its content is
+        never indexed. Any other storage (ir_attachment.location) needs the
+        content itself and falls back to a regular create.
+        """
+        if self._storage() != 'file':
+            with open(path, 'rb') as source:
+                return self.create(dict(vals, raw=source.read()))
+
+        with open(path, 'rb') as source:
+            file_size = os.fstat(source.fileno()).st_size
+            if not file_size:
+                return self.create(dict(vals, raw=b''))
+            with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as content:
+                checksum = hashlib.sha1(content).hexdigest()
+                fname = self._file_write(content, checksum)
+
+        attachment = self.create(dict(vals, type='binary'))
+        # create() drops the filestore columns from its values, they are set directly
+        self.flush_model()
+        self.env.cr.execute("""
+            UPDATE ir_attachment
+               SET store_fname = %s, checksum = %s, file_size = %s
+             WHERE id = %s
+        """, [fname, checksum, file_size, attachment.id])
+        attachment.invalidate_recordset(['store_fname', 'checksum', 'file_size', 'raw', 'datas', 'db_datas'])
+        return attachment
@@ -1,7 +1,11 @@
 # -*- coding: utf-8 -*-
 
-def _post_init_hook(cr, registry):
-    """Post initialization hook for the Hospital module"""
+def _post_init_hook(env):
+    """Post initialization hook for the Hospital module
+
+    Indexes that upgraded databases need as well are created in the init()
+    of their model instead.
+    """
 
     # Create indexes to improve database performance
     queries = [
@@ -20,7 +24,6 @@ def _post_init_hook(cr, registry):
         # Visit indexes
         "CREATE INDEX IF NOT EXISTS idx_visit_datetime ON hr_hospital_visit (planned_datetime)",
         "CREATE INDEX IF NOT EXISTS idx_visit_state ON hr_hospital_visit (state)",
-        "CREATE INDEX IF NOT EXISTS idx_visit_patient_doctor_date ON hr_hospital_visit (patient_id, doctor_id, (planned_datetime::date))",
 
         # Diagnosis indexes
         "CREATE INDEX IF NOT EXISTS idx_diagnosis_date ON hr_hospital_diagnosis (diagnosis_date)",
@@ -30,4 +33,4 @@ def _post_init_hook(cr, registry):
     ]
 
     for query in queries:
-        cr.execute(query)
\ No newline at end of file
+        env.cr.execute(query)
\ No newline at end of file
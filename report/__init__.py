@@ -0,0 +1 @@
+from . import hr_hospital_diagnosis_report
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api, tools
+
+MATERIALIZED_PARAM = 'hr_hospital.diagnosis_report_materialized'
+
+
+class HrHospitalDiagnosisReport(models.Model):
+    _name = 'hr.hospital.diagnosis.report'
+    _description = 'Diagnosis Analysis'
+    _auto = False
+    _order = 'diagnosis_date desc'
+    _rec_name = 'diagnosis_id'
+
+    diagnosis_id = fields.Many2one('hr.hospital.diagnosis', string='Diagnosis', readonly=True)
+    diagnosis_date = fields.Datetime(string='Examination Date', readonly=True)
+    month = fields.Date(string='Month', readonly=True)
+    visit_id = fields.Many2one('hr.hospital.visit', string='Visit', readonly=True)
+    visit_type = fields.Selection(
+        selection=lambda self: self.env['hr.hospital.visit']._fields['visit_type'].selection,
+        string='Visit Type',
+        readonly=True
+    )
+    disease_id = fields.Many2one('hr.hospital.disease', string='Disease', readonly=True)
+    danger_level = fields.Selection(
+        selection=lambda self: self.env['hr.hospital.disease']._fields['danger_level'].selection,
+        string='Danger Level',
+        readonly=True
+    )
+    is_infectious = fields.Boolean(string='Infectious', readonly=True)
+    doctor_id = fields.Many2one('hr.hospital.doctor', string='Doctor', readonly=True)
+    speciality_id = fields.Many2one('hr.hospital.doctor.speciality', string='Specialty', readonly=True)
+    patient_id = fields.Many2one('hr.hospital.patient', string='Patient', readonly=True)
+    country_id = fields.Many2one('res.country', string='Patient Country', readonly=True)
+    age_band = fields.Selection([
+        ('0_17', '0-17'),
+        ('18_34', '18-34'),
+        ('35_49', '35-49'),
+        ('50_64', '50-64'),
+        ('65_plus', '65+'),
+        ('unknown', 'Unknown')
+    ], string='Age Band', readonly=True, help='Patient age at the examination date')
+    severity = fields.Selection(
+        selection=lambda self: self.env['hr.hospital.diagnosis']._fields['severity'].selection,
+        string='Severity Level',
+        readonly=True
+    )
+    is_approved = fields.Boolean(string='Approved', readonly=True)
+    nbr = fields.Integer(string='# Diagnoses', readonly=True, aggregator='sum')
+
+    def _query(self):
+        return """
+            SELECT d.id AS id,
+                   d.id AS diagnosis_id,
+                   d.diagnosis_date AS diagnosis_date,
+                   date_trunc('month', d.diagnosis_date)::date AS month,
+                   d.visit_id AS visit_id,
+                   v.visit_type AS visit_type,
+                   d.disease_id AS disease_id,
+                   dis.danger_level AS danger_level,
+                   dis.is_infectious AS is_infectious,
+                   d.doctor_id AS doctor_id,
+                   doc.speciality_id AS speciality_id,
+                   d.patient_id AS patient_id,
+                   p.country_id AS country_id,
+                   CASE
+                       WHEN p.birth_date IS NULL THEN 'unknown'
+                       WHEN age(d.diagnosis_date::date, p.birth_date) < interval '18 years' THEN '0_17'
+                       WHEN age(d.diagnosis_date::date, p.birth_date) < interval '35 years' THEN '18_34'
+                       WHEN age(d.diagnosis_date::date, p.birth_date) < interval '50 years' THEN '35_49'
+                       WHEN age(d.diagnosis_date::date, p.birth_date) < interval '65 years' THEN '50_64'
+                       ELSE '65_plus'
+                   END AS age_band,
+                   d.severity AS severity,
+                   d.is_approved AS is_approved,
+                   1 AS nbr
+              FROM hr_hospital_diagnosis d
+              JOIN hr_hospital_disease dis ON dis.id = d.disease_id
+         LEFT JOIN hr_hospital_visit v ON v.id = d.visit_id
+         LEFT JOIN hr_hospital_doctor doc ON doc.id = d.doctor_id
+         LEFT JOIN hr_hospital_patient p ON p.id = d.patient_id
+        """
+
+    @api.model
+    def _is_materialized(self):
+        return bool(self.env['ir.config_parameter'].sudo().get_param(MATERIALIZED_PARAM))
+
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        if self._is_materialized():
+            self.env.cr.execute(f"CREATE MATERIALIZED VIEW {self._table} AS ({self._query()})")
+            # The unique index allows REFRESH ... CONCURRENTLY
+            self.env.cr.execute(f"CREATE UNIQUE INDEX {self._table}_id_idx ON {self._table} (id)")
+            self.env.cr.execute(f"CREATE INDEX {self._table}_month_idx ON {self._table} (month, disease_id)")
+        else:
+            self.env.cr.execute(f"CREATE VIEW {self._table} AS ({self._query()})")
+
+    @api.model
+    def _set_materialized(self, materialized=True):
+        """Switch between a plain view and a materialized view"""
+        self.env['ir.config_parameter'].sudo().set_param(MATERIALIZED_PARAM, materialized and '1' or '')
+        self.init()
+
+    @api.model
+    def _refresh_materialized_view(self):
+        """Refresh the materialized variant, no-op for the plain view"""
+        if not self._is_materialized():
+            return
+        self.env['hr.hospital.diagnosis'].flush_model()
+        self.env.cr.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {self._table}")
+        self.invalidate_model()
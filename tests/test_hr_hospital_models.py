@@ -1,6 +1,14 @@
 # -*- coding: utf-8 -*-
+import csv
+import io
+import json
+import tempfile
+from datetime import date, timedelta
+
+from odoo import fields
 from odoo.tests.common import TransactionCase
-from odoo.exceptions import ValidationError
+from odoo.exceptions import AccessError, ValidationError
+from odoo.tools import mute_logger
 
 
 class TestHrHospitalModels(TransactionCase):
@@ -65,6 +73,11 @@ class TestHrHospitalModels(TransactionCase):
         with self.assertRaises(ValidationError):
             self.doctor.write({'rating': 6.0})  # Above 5.0
 
+    def test_counter_fields(self):
+        """Test grouped count fields"""
+        self.assertEqual(self.specialty.doctors_count, 1)
+        self.assertEqual(self.doctor.active_patients_count, 1)
+
     def test_patient_constraints(self):
         """Test patient model constraints"""
         # Test unique passport
@@ -97,6 +110,208 @@ class TestHrHospitalModels(TransactionCase):
                 'visit_type': 'follow_up'
             })
 
+    def _create_work_day(self, days_ahead=7, doctor=None):
+        """Give the doctor a working day in the future and return its date"""
+        work_day = date.today() + timedelta(days=days_ahead)
+        self.env['hr.hospital.doctor.schedule'].create({
+            'doctor_id': (doctor or self.doctor).id,
+            'day_of_week': str(work_day.weekday()),
+            'start_time': 8.0,
+            'end_time': 18.0,
+            'schedule_type': 'work'
+        })
+        return work_day
+
+    def _create_past_visit(self, patient, doctor=None, days_ago=60):
+        """Completed visit moved into the past, where diagnoses can be recorded against it"""
+        doctor = doctor or self.doctor
+        work_day = self._create_work_day(doctor=doctor)
+        visit = self.env['hr.hospital.visit'].create({
+            'patient_id': patient.id,
+            'doctor_id': doctor.id,
+            'planned_datetime': f'{work_day} 10:00:00',
+            'visit_type': 'first'
+        })
+        # Visits cannot be planned in the past through the ORM
+        self.env.cr.execute(
+            "UPDATE hr_hospital_visit SET planned_datetime = %s, state = 'completed' WHERE id = %s",
+            [fields.Datetime.now() - timedelta(days=days_ago), visit.id]
+        )
+        visit.invalidate_recordset(['planned_datetime', 'state'])
+        return visit
+
+    def _create_diagnosis(self, visit, disease, severity='mild', days_ago=0, approved=True):
+        diagnosis = self.env['hr.hospital.diagnosis'].create({
+            'visit_id': visit.id,
+            'disease_id': disease.id,
+            'description': 'Test diagnosis',
+            'severity': severity,
+            'diagnosis_date': fields.Datetime.now() - timedelta(days=days_ago)
+        })
+        if approved:
+            diagnosis.action_approve_diagnosis()
+        return diagnosis
+
+    def test_visit_duplicate_in_batch(self):
+        """Test duplicates inside a single multi-create are rejected"""
+        work_day = self._create_work_day()
+        with mute_logger('odoo.sql_db'), self.assertRaises(ValidationError):
+            self.env['hr.hospital.visit'].create([{
+                'patient_id': self.patient.id,
+                'doctor_id': self.doctor.id,
+                'planned_datetime': f'{work_day} {hour}',
+                'visit_type': 'first'
+            } for hour in ('10:00:00', '15:00:00')])
+
+    def test_visit_duplicate_on_write(self):
+        """Test moving a visit onto a day already booked is rejected"""
+        work_day = self._create_work_day()
+        Visit = self.env['hr.hospital.visit']
+        Visit.create({
+            'patient_id': self.patient.id,
+            'doctor_id': self.doctor.id,
+            'planned_datetime': f'{work_day} 10:00:00',
+            'visit_type': 'first'
+        })
+        other_day = Visit.create({
+            'patient_id': self.patient.id,
+            'doctor_id': self.doctor.id,
+            'planned_datetime': f'{work_day + timedelta(days=7)} 10:00:00',
+            'visit_type': 'follow_up'
+        })
+        with mute_logger('odoo.sql_db'), self.assertRaises(ValidationError):
+            other_day.write({'planned_datetime': f'{work_day} 15:00:00'})
+
+    def test_visit_bulk_create_report(self):
+        """Test bulk visit creation inserts valid rows and reports errors per row"""
+        work_day = self._create_work_day()
+        Patient = self.env['hr.hospital.patient']
+        booked_patient = Patient.create({'first_name': 'Booked', 'last_name': 'Patient', 'passport': '2234567890'})
+        other_patient = Patient.create({'first_name': 'Other', 'last_name': 'Patient', 'passport': '3234567890'})
+        failing_patient = Patient.create({'first_name': 'Failing', 'last_name': 'Patient', 'passport': '4234567890'})
+        self.env['hr.hospital.visit'].create({
+            'patient_id': booked_patient.id,
+            'doctor_id': self.doctor.id,
+            'planned_datetime': f'{work_day} 09:00:00',
+            'visit_type': 'first'
+        })
+        missing_currency_id = self.env['res.currency'].search([], order='id desc', limit=1).id + 1000
+
+        def row(patient, hour, **extra):
+            return dict({
+                'patient_id': patient.id,
+                'doctor_id': self.doctor.id,
+                'planned_datetime': f'{work_day} {hour}',
+                'visit_type': 'first'
+            }, **extra)
+
+        with mute_logger('odoo.sql_db'):
+            result = self.env['hr.hospital.visit'].bulk_create_visits([
+                row(self.patient, '10:00:00'),
+                # Same patient, doctor and day as the row above
+                row(self.patient, '14:00:00'),
+                # Same patient, doctor and day as an existing visit
+                row(booked_patient, '11:00:00'),
+                row(other_patient, '12:00:00'),
+                # Passes validation but fails at INSERT, sinking its chunk
+                row(failing_patient, '13:00:00', currency_id=missing_currency_id),
+            ])
+
+        created = self.env['hr.hospital.visit'].browse(result['created_ids'])
+        self.assertEqual(created.patient_id, self.patient | other_patient)
+        self.assertEqual(len(created), 2)
+        self.assertEqual([error['row'] for error in result['errors']], [1, 2, 4])
+
+    def test_free_intervals(self):
+        """Test free slots subtract absences and bookings, dated rows overriding weekly ones"""
+        work_day = self._create_work_day()
+        next_week = work_day + timedelta(days=7)
+        Schedule = self.env['hr.hospital.doctor.schedule']
+        # Shorter hours on work_day only, replacing the weekly 8-18
+        Schedule.create({
+            'doctor_id': self.doctor.id,
+            'day_of_week': str(work_day.weekday()),
+            'specific_date': work_day,
+            'start_time': 8.0,
+            'end_time': 12.0,
+            'schedule_type': 'work'
+        })
+        Schedule.create({
+            'doctor_id': self.doctor.id,
+            'day_of_week': str(next_week.weekday()),
+            'specific_date': next_week,
+            'start_time': 10.0,
+            'end_time': 11.0,
+            'schedule_type': 'conference'
+        })
+        self.env['hr.hospital.visit'].create({
+            'patient_id': self.patient.id,
+            'doctor_id': self.doctor.id,
+            'planned_datetime': f'{next_week} 14:00:00',
+            'visit_type': 'first'
+        })
+
+        free = self.env['hr.hospital.visit']._get_free_intervals(self.doctor.ids, work_day, next_week)
+        self.assertEqual(free[(self.doctor.id, work_day)], [(8.0, 12.0)])
+        self.assertEqual(free[(self.doctor.id, next_week)], [(8.0, 10.0), (11.0, 14.0), (14.5, 18.0)])
+
+    def test_free_intervals_cache(self):
+        """Test cached free slots follow visit creation and deletion"""
+        work_day = self._create_work_day()
+        Visit = self.env['hr.hospital.visit']
+        key = (self.doctor.id, work_day)
+
+        def cached_slots():
+            return Visit._get_free_intervals_cached(self.doctor.ids, work_day, work_day)[key]
+
+        self.assertEqual(cached_slots(), [(8.0, 18.0)])
+        visit = Visit.create({
+            'patient_id': self.patient.id,
+            'doctor_id': self.doctor.id,
+            'planned_datetime': f'{work_day} 10:00:00',
+            'visit_type': 'first'
+        })
+        self.assertEqual(cached_slots(), [(8.0, 10.0), (10.5, 18.0)])
+        visit.unlink()
+        self.assertEqual(cached_slots(), [(8.0, 18.0)])
+
+    def test_visit_batch_state_change(self):
+        """Test batched state changes log one note per visit, or one summary note"""
+        work_day = self._create_work_day()
+        other_patient = self.env['hr.hospital.patient'].create({
+            'first_name': 'Other', 'last_name': 'Patient', 'passport': '6234567890'
+        })
+        Visit = self.env['hr.hospital.visit']
+        Message = self.env['mail.message']
+
+        def create_visits(day):
+            return Visit.create([{
+                'patient_id': patient.id,
+                'doctor_id': self.doctor.id,
+                'planned_datetime': f'{day} {hour}',
+                'visit_type': 'first'
+            } for patient, hour in ((self.patient, '10:00:00'), (other_patient, '11:00:00'))])
+
+        visits = create_visits(work_day)
+        visits.action_cancel_visit()
+        self.assertEqual(set(visits.mapped('state')), {'cancelled'})
+        notes = Message.search([
+            ('model', '=', 'hr.hospital.visit'),
+            ('res_id', 'in', visits.ids),
+            ('body', 'ilike', 'Visit cancelled')
+        ])
+        self.assertEqual(sorted(notes.mapped('res_id')), sorted(visits.ids))
+
+        visits = create_visits(work_day + timedelta(days=7))
+        visits.with_context(visit_state_summary=True).action_mark_no_show()
+        self.assertEqual(set(visits.mapped('state')), {'no_show'})
+        notes = Message.search([
+            ('model', '=', 'hr.hospital.visit'),
+            ('res_id', 'in', visits.ids),
+            ('body', 'ilike', 'Patient did not show up')
+        ])
+        self.assertEqual(len(notes), 1)
+
     def test_doctor_schedule_constraints(self):
         """Test doctor schedule constraints"""
         # Test time validation
@@ -161,6 +376,471 @@ class TestHrHospitalModels(TransactionCase):
         ])
         self.assertTrue(old_history)
 
+    def test_doctor_history_multi_create(self):
+        """Test one multi-create closes the active history of every patient on its new assignment date"""
+        other_patient = self.env['hr.hospital.patient'].create({
+            'first_name': 'History',
+            'last_name': 'Patient',
+            'passport': '8234567890'
+        })
+        History = self.env['hr.hospital.patient.doctor.history']
+        old_history = History.create([{
+            'patient_id': patient.id,
+            'doctor_id': self.doctor.id,
+            'assignment_date': date.today() - timedelta(days=100),
+        } for patient in (self.patient, other_patient)])
+        self.assertTrue(all(old_history.mapped('active')))
+
+        first_change, second_change = date.today() - timedelta(days=10), date.today() - timedelta(days=5)
+        new_history = History.create([{
+            'patient_id': self.patient.id,
+            'doctor_id': self.doctor.id,
+            'assignment_date': first_change,
+        }, {
+            'patient_id': other_patient.id,
+            'doctor_id': self.doctor.id,
+            'assignment_date': second_change,
+        }])
+        self.assertTrue(all(new_history.mapped('active')))
+        self.assertFalse(any(old_history.mapped('active')))
+        self.assertEqual(old_history.mapped('change_date'), [first_change, second_change])
+
+    def test_mass_reassign_doctor(self):
+        """Test mass reassignment leaves one active history row per patient"""
+        new_doctor = self.env['hr.hospital.doctor'].create({
+            'first_name': 'Mass',
+            'last_name': 'Doctor',
+            'speciality_id': self.specialty.id,
+            'license_number': 'MASS123456',
+            'license_date': '2021-01-01'
+        })
+        other_patient = self.env['hr.hospital.patient'].create({
+            'first_name': 'Other',
+            'last_name': 'Patient',
+            'personal_doctor_id': self.doctor.id,
+            'passport': '5234567890'
+        })
+        patients = self.patient | other_patient
+        History = self.env['hr.hospital.patient.doctor.history'].with_context(active_test=False)
+        old_history = History.create([{
+            'patient_id': patient.id,
+            'doctor_id': self.doctor.id,
+            'assignment_date': date.today() - timedelta(days=30)
+        } for patient in patients])
+
+        wizard = self.env['hr.hospital.mass.reassign.doctor.wizard'].create({
+            'old_doctor_id': self.doctor.id,
+            'new_doctor_id': new_doctor.id,
+            'patient_ids': [(6, 0, patients.ids)],
+            'reason': 'Doctor retired'
+        })
+        wizard.action_reassign_doctor()
+
+        self.assertEqual(patients.personal_doctor_id, new_doctor)
+        # Archived rows included: exactly one new row per patient, no duplicates
+        new_history = History.search([('patient_id', 'in', patients.ids)]) - old_history
+        self.assertEqual(len(new_history), 2)
+        self.assertEqual(new_history.patient_id, patients)
+        self.assertEqual(new_history.doctor_id, new_doctor)
+        self.assertTrue(all(new_history.mapped('active')))
+        self.assertFalse(any(old_history.mapped('active')))
+
+    def _create_report_data(self):
+        """Approved diagnoses of two doctors, diseases and countries, one of them 40 days old"""
+        self.other_doctor = self.env['hr.hospital.doctor'].create({
+            'first_name': 'Report',
+            'last_name': 'Doctor',
+            'speciality_id': self.specialty.id,
+            'license_number': 'REPORT123456',
+            'license_date': '2021-01-01'
+        })
+        Disease = self.env['hr.hospital.disease']
+        self.disease_a = Disease.create({'name': 'Report Disease A', 'icd10_code': 'Y01', 'danger_level': 'high'})
+        self.disease_b = Disease.create({'name': 'Report Disease B', 'icd10_code': 'Y02', 'danger_level': 'high'})
+        self.patient.country_id = self.env.ref('base.ua')
+        self.other_patient = self.env['hr.hospital.patient'].create({
+            'first_name': 'Report',
+            'last_name': 'Patient',
+            'passport': '7234567890',
+            'country_id': self.env.ref('base.pl').id
+        })
+        visit = self.report_visit = self._create_past_visit(self.patient)
+        other_visit = self._create_past_visit(self.other_patient, doctor=self.other_doctor)
+        self._create_diagnosis(visit, self.disease_a, 'mild')
+        self._create_diagnosis(visit, self.disease_a, 'severe', days_ago=40)
+        self._create_diagnosis(other_visit, self.disease_b, 'mild')
+        self._create_diagnosis(other_visit, self.disease_b, 'mild', approved=False)
+
+    def test_disease_report_groupings(self):
+        """Test the disease report counts approved diagnoses per grouping"""
+        self._create_report_data()
+
+        def counts(group_by, sub_group_by=None):
+            wizard = self.env['hr.hospital.disease.report.wizard'].create({
+                'start_date': date.today() - timedelta(days=50),
+                'end_date': date.today(),
+                'doctor_ids': [(6, 0, (self.doctor | self.other_doctor).ids)],
+                'group_by': group_by,
+                'sub_group_by': sub_group_by or group_by,
+            })
+            result = wizard._get_report_result()
+            return {group[group_by]: group for group in result['data']}, result['total_diagnoses']
+
+        groups, total = counts('country')
+        self.assertEqual(total, 3)
+        self.assertEqual({label: group['count'] for label, group in groups.items()}, {
+            self.env.ref('base.ua').name: 2,
+            self.env.ref('base.pl').name: 1,
+        })
+
+        groups, _total = counts('doctor')
+        self.assertEqual({label: group['count'] for label, group in groups.items()}, {
+            self.doctor.full_name: 2,
+            self.other_doctor.full_name: 1,
+        })
+
+        groups, _total = counts('severity')
+        self.assertEqual({label: group['count'] for label, group in groups.items()}, {'Mild': 2, 'Severe': 1})
+
+        groups, _total = counts('month')
+        today = fields.Datetime.now()
+        self.assertEqual({label: group['count'] for label, group in groups.items()}, {
+            today.strftime('%Y-%m'): 2,
+            (today - timedelta(days=40)).strftime('%Y-%m'): 1,
+        })
+
+        groups, _total = counts('disease', 'severity')
+        self.assertEqual(groups[self.disease_a.name]['severities'], {'Mild': 1, 'Severe': 1})
+        self.assertEqual(groups[self.disease_b.name]['severities'], {'Mild': 1})
+
+    def test_disease_report_cache(self):
+        """Test cached reports follow new diagnoses and renamed records"""
+        self._create_report_data()
+        wizard = self.env['hr.hospital.disease.report.wizard'].create({
+            'start_date': date.today() - timedelta(days=50),
+            'end_date': date.today(),
+            'doctor_ids': [(6, 0, (self.doctor | self.other_doctor).ids)],
+            'group_by': 'doctor',
+            'sub_group_by': 'country',
+        })
+
+        def counts():
+            return {group['doctor']: group['count'] for group in wizard._get_report_result()['data']}
+
+        self.assertEqual(counts()[self.doctor.full_name], 2)
+        hits = wizard.get_report_cache_stats()['hits']
+        self.assertEqual(counts()[self.doctor.full_name], 2)
+        self.assertEqual(wizard.get_report_cache_stats()['hits'], hits + 1)
+
+        self._create_diagnosis(self.report_visit, self.disease_b, 'moderate')
+        self.assertEqual(counts()[self.doctor.full_name], 3)
+
+        # Labels are resolved on every read, the cached counts stay valid
+        self.doctor.last_name = 'Renamed'
+        self.env.ref('base.ua').name = 'Renamed Country'
+        hits = wizard.get_report_cache_stats()['hits']
+        result = wizard._get_report_result()
+        self.assertEqual(wizard.get_report_cache_stats()['hits'], hits + 1)
+        groups = {group['doctor']: group for group in result['data']}
+        self.assertEqual(groups[self.doctor.full_name]['count'], 3)
+        self.assertEqual(groups[self.doctor.full_name]['countries'], {'Renamed Country': 3})
+
+    def _create_user(self, login):
+        return self.env['res.users'].create({
+            'name': login.title(),
+            'login': login,
+            'group_ids': [(6, 0, self.env.ref('base.group_user').ids)],
+        })
+
+    def test_disease_incidence(self):
+        """Test the weekly incidence averages and flags a surge above the baseline"""
+        disease = self.env['hr.hospital.disease'].create({
+            'name': 'Incidence Flu', 'icd10_code': 'Y20', 'danger_level': 'high', 'is_infectious': True
+        })
+        self.patient.country_id = self.env.ref('base.ua')
+        visit = self._create_past_visit(self.patient)
+        # One case two weeks ago, then three cases this week
+        self._create_diagnosis(visit, disease, days_ago=14, approved=False)
+        for _i in range(3):
+            self._create_diagnosis(visit, disease, approved=False)
+
+        Incidence = self.env['hr.hospital.disease.incidence']
+        Incidence._refresh(date_from=date.today() - timedelta(weeks=4))
+        today = fields.Date.context_today(Incidence)
+        rows = {row.week_start: row for row in Incidence.search([('disease_id', '=', disease.id)])}
+        current = rows[today - timedelta(days=today.weekday())]
+        earlier = rows[fields.Date.subtract(current.week_start, weeks=2)]
+        self.assertEqual(len(rows), 2)
+
+        self.assertEqual(earlier.case_count, 1)
+        self.assertAlmostEqual(earlier.rolling_average, 0.25)
+        self.assertFalse(earlier.is_above_baseline)
+
+        # Rolling average over four weeks, baseline from the twelve previous ones
+        self.assertEqual(current.case_count, 3)
+        self.assertAlmostEqual(current.rolling_average, 1.0)
+        self.assertAlmostEqual(current.baseline, 1 / 12 + 2 * (11 / 144) ** 0.5, places=2)
+        self.assertTrue(current.is_above_baseline)
+        self.assertEqual(current.country_id, self.env.ref('base.ua'))
+        self.assertTrue(current.is_new_region)
+
+    def test_patient_card_content(self):
+        """Test the streamed JSON and CSV cards hold the visits and diagnoses of the patient"""
+        Disease = self.env['hr.hospital.disease']
+        flu = Disease.create({'name': 'Card Flu', 'icd10_code': 'Y30', 'danger_level': 'medium'})
+        asthma = Disease.create({'name': 'Card Asthma', 'icd10_code': 'Y31', 'danger_level': 'low'})
+        visit = self._create_past_visit(self.patient)
+        self._create_diagnosis(visit, flu)
+        self._create_diagnosis(visit, asthma, severity='severe', days_ago=1, approved=False)
+
+        Wizard = self.env['hr.hospital.patient.card.export.wizard']
+        wizard = Wizard.create({'patient_id': self.patient.id, 'export_format': 'json'})
+        output = io.StringIO()
+        wizard._write_card(wizard._stream_card(self.patient.id), output)
+        card = wizard._collect_cards(self.patient)[self.patient.id]
+        # Streaming writes exactly what json.dump() would for the whole card
+        self.assertEqual(output.getvalue(), json.dumps(card, indent=2, ensure_ascii=False))
+
+        data = json.loads(output.getvalue())
+        self.assertEqual(data['patient']['full_name'], self.patient.full_name)
+        self.assertEqual(data['patient']['personal_doctor'], self.doctor.full_name)
+        self.assertEqual([(diag['disease'], diag['severity'], diag['approved']) for diag in data['diagnoses']], [
+            ('Card Flu', 'Mild', True),
+            ('Card Asthma', 'Severe', False),
+        ])
+        self.assertEqual([(item['doctor'], item['status']) for item in data['visits']], [
+            (self.doctor.full_name, 'Completed'),
+        ])
+
+        wizard.export_format = 'csv'
+        output = io.StringIO()
+        wizard._write_card(wizard._stream_card(self.patient.id), output)
+        rows = list(csv.reader(io.StringIO(output.getvalue())))
+        self.assertIn(['full_name', self.patient.full_name], rows)
+        diagnoses_start = rows.index(['DIAGNOSES']) + 2
+        self.assertEqual([row[1:4] + row[5:] for row in rows[diagnoses_start:diagnoses_start + 2]], [
+            ['Card Flu', self.doctor.full_name, 'Mild', 'Yes'],
+            ['Card Asthma', self.doctor.full_name, 'Severe', 'No'],
+        ])
+        visits_start = rows.index(['VISITS']) + 2
+        self.assertEqual(rows[visits_start:], [[
+            data['visits'][0]['date'], self.doctor.full_name, data['visits'][0]['type'], 'Completed',
+            str(data['visits'][0]['cost']), data['visits'][0]['currency'],
+        ]])
+
+    def test_patient_card_export_cleanup(self):
+        """Test unchanged cards are reused and old card exports are removed"""
+        Wizard = self.env['hr.hospital.patient.card.export.wizard']
+        wizard = Wizard.create({'patient_id': self.patient.id, 'export_format': 'csv'})
+        action = wizard.action_export_patient_card()
+        self.assertEqual(wizard.action_export_patient_card(), action)
+        attachment = self.env['ir.attachment'].search([
+            ('res_model', '=', 'hr.hospital.patient'),
+            ('res_id', '=', self.patient.id),
+            ('description', '=like', 'medical_card:%'),
+        ])
+        self.assertEqual(len(attachment), 1)
+
+        Wizard._gc_old_card_exports()
+        self.assertTrue(attachment.exists())
+        self.env.cr.execute(
+            "UPDATE ir_attachment SET create_date = %s WHERE id = %s",
+            [fields.Datetime.now() - timedelta(days=30), attachment.id]
+        )
+        attachment.invalidate_recordset(['create_date'])
+        Wizard._gc_old_card_exports()
+        self.assertFalse(attachment.exists())
+
+    def _read_export_lines(self, attachment_ids):
+        """NDJSON lines of an export run, as {model name: [line, ...]}"""
+        lines = {}
+        for attachment in self.env['ir.attachment'].browse(attachment_ids):
+            model_name = self.env['hr.hospital.export.watermark'].browse(attachment.res_id).model_name
+            lines.setdefault(model_name, []).extend(
+                json.loads(line) for line in attachment.raw.decode('utf-8').splitlines()
+            )
+        return lines
+
+    def test_change_export(self):
+        """Test a second export run carries the changed rows and the deletions"""
+        disease = self.env['hr.hospital.disease'].create({
+            'name': 'Export Disease', 'icd10_code': 'Y40', 'danger_level': 'low'
+        })
+        visit = self._create_past_visit(self.patient)
+        kept = self._create_diagnosis(visit, disease)
+        deleted = self._create_diagnosis(visit, disease, severity='severe')
+        deleted_id = deleted.id
+
+        Watermark = self.env['hr.hospital.export.watermark']
+        first_run = self._read_export_lines(Watermark.run_export())
+        self.assertIn(deleted_id, [line['id'] for line in first_run['hr.hospital.diagnosis']])
+
+        kept.description = 'Updated diagnosis'
+        deleted.unlink()
+        attachment_ids = Watermark.run_export()
+        lines = self._read_export_lines(attachment_ids)['hr.hospital.diagnosis']
+        upserts = {line['id']: line for line in lines if line['_op'] == 'upsert'}
+        self.assertEqual(upserts[kept.id]['description'], 'Updated diagnosis')
+        self.assertNotIn(deleted_id, upserts)
+        self.assertIn(deleted_id, [line['id'] for line in lines if line['_op'] == 'delete'])
+
+        # Chunks are dropped once past the retention period
+        self.env['ir.attachment'].flush_model()
+        self.env.cr.execute(
+            "UPDATE ir_attachment SET create_date = %s WHERE id = ANY(%s)",
+            [fields.Datetime.now() - timedelta(days=30), attachment_ids]
+        )
+        self.env['ir.attachment'].invalidate_model(['create_date'])
+        Watermark._gc_export_chunks()
+        self.assertFalse(self.env['ir.attachment'].browse(attachment_ids).exists())
+
+    def test_disease_report_result_access(self):
+        """Test users only see and keep the report results they generated"""
+        author, other = self._create_user('report_author'), self._create_user('report_other')
+        Result = self.env['hr.hospital.disease.report.result']
+        result = Result.with_user(author).create({
+            'name': 'Own Report',
+            'line_ids': [(0, 0, {'label': 'Flu', 'count': 1})],
+        })
+        self.assertEqual(Result.with_user(author).search([('id', '=', result.id)]), result)
+        self.assertFalse(Result.with_user(other).search([('id', '=', result.id)]))
+        self.assertFalse(self.env['hr.hospital.disease.report.result.line'].with_user(other).search([
+            ('result_id', '=', result.id)
+        ]))
+        with self.assertRaises(AccessError):
+            result.with_user(author).unlink()
+
+    def test_attachment_from_file(self):
+        """Test attachments created from a file hold its content in the configured storage"""
+        content = b'patient;visits\n' * 1000
+        with tempfile.NamedTemporaryFile() as source:
+            source.write(content)
+            source.flush()
+            Attachment = self.env['ir.attachment']
+            attachment = Attachment._create_from_file(source.name, {'name': 'card.csv', 'mimetype': 'text/csv'})
+            self.assertEqual(attachment.raw, content)
+            self.assertEqual(attachment.checksum, Attachment._compute_checksum(content))
+            self.assertEqual(attachment.file_size, len(content))
+            self.assertTrue(attachment.store_fname)
+
+            self.env['ir.config_parameter'].set_param('ir_attachment.location', 'db')
+            attachment = Attachment._create_from_file(source.name, {'name': 'card.csv', 'mimetype': 'text/csv'})
+            self.assertEqual(attachment.raw, content)
+            self.assertFalse(attachment.store_fname)
+
+    def test_patient_card_export_job_access(self):
+        """Test users only see their own export jobs and archives, and can only retry them"""
+        author, other = self._create_user('export_author'), self._create_user('export_other')
+        Job = self.env['hr.hospital.patient.card.export.job']
+        job = Job.with_user(author).create({'name': 'Own Export'})
+        job.write({'state': 'failed'})
+        attachment = self.env['ir.attachment'].create({
+            'name': 'cards.zip',
+            'raw': b'archive',
+            'res_model': job._name,
+            'res_id': job.id,
+        })
+
+        self.assertFalse(Job.with_user(other).search([('id', '=', job.id)]))
+        self.assertFalse(self.env['ir.attachment'].with_user(other).search([('id', '=', attachment.id)]))
+        self.assertEqual(self.env['ir.attachment'].with_user(author).search([('id', '=', attachment.id)]), attachment)
+        with self.assertRaises(AccessError):
+            job.with_user(author).write({'state': 'done'})
+        with self.assertRaises(AccessError):
+            job.with_user(author).unlink()
+        job.with_user(author).action_retry()
+        self.assertEqual(job.state, 'pending')
+
+    def _get_rollup_rows(self):
+        rows = self.env['hr.hospital.diagnosis.daily'].search_read([], [
+            'day', 'disease_id', 'doctor_id', 'country_id', 'severity', 'diagnosis_count', 'approved_count'
+        ])
+        return sorted(
+            tuple(row[name][0] if isinstance(row[name], tuple) else row[name] for name in (
+                'day', 'disease_id', 'doctor_id', 'country_id', 'severity', 'diagnosis_count', 'approved_count'
+            ))
+            for row in rows
+        )
+
+    def assertRollupFresh(self):
+        """The incrementally maintained rollup must equal a full recomputation"""
+        rows = self._get_rollup_rows()
+        self.env['hr.hospital.diagnosis.daily']._rebuild()
+        self.assertEqual(rows, self._get_rollup_rows())
+
+    def test_diagnosis_rollup(self):
+        """Test the daily rollup follows diagnosis, visit and patient changes"""
+        self._create_report_data()
+        self.assertRollupFresh()
+
+        doctor = self.env['hr.hospital.doctor'].create({
+            'first_name': 'Rollup',
+            'last_name': 'Doctor',
+            'speciality_id': self.specialty.id,
+            'license_number': 'ROLLUP123456',
+            'license_date': '2021-01-01'
+        })
+        work_day = self._create_work_day(doctor=doctor)
+        visit = self.env['hr.hospital.visit'].create({
+            'patient_id': self.patient.id,
+            'doctor_id': doctor.id,
+            'planned_datetime': f'{work_day} 10:00:00',
+            'visit_type': 'first'
+        })
+        # Still open three days later, so its doctor and patient can change
+        self.env.cr.execute(
+            "UPDATE hr_hospital_visit SET planned_datetime = %s, state = 'in_progress' WHERE id = %s",
+            [f'{date.today() - timedelta(days=3)} 10:00:00', visit.id]
+        )
+        visit.invalidate_recordset(['planned_datetime', 'state'])
+
+        diagnosis = self._create_diagnosis(visit, self.disease_a, 'moderate', approved=False)
+        self.assertRollupFresh()
+        diagnosis.action_approve_diagnosis()
+        self.assertRollupFresh()
+
+        self._create_work_day(days_ahead=4, doctor=self.other_doctor)
+        visit.doctor_id = self.other_doctor
+        self.assertRollupFresh()
+        visit.patient_id = self.other_patient
+        self.assertRollupFresh()
+
+        self.other_patient.country_id = self.env.ref('base.de')
+        self.assertRollupFresh()
+
+        diagnosis.unlink()
+        self.assertRollupFresh()
+        rows = self.env['hr.hospital.diagnosis.daily'].search([('disease_id', '=', self.disease_a.id)])
+        self.assertEqual(sum(rows.mapped('diagnosis_count')), 2)
+        self.assertEqual(sorted(rows.mapped('severity')), ['mild', 'severe'])
+
+    def test_disease_hierarchy_counts(self):
+        """Test categories count the approved diagnoses of all their subcategories"""
+        Disease = self.env['hr.hospital.disease']
+        parent = Disease.create({'name': 'Hierarchy Parent', 'icd10_code': 'Y10', 'danger_level': 'medium'})
+        child = Disease.create({
+            'name': 'Hierarchy Child', 'icd10_code': 'Y10.1', 'danger_level': 'high', 'parent_id': parent.id
+        })
+        grandchild = Disease.create({
+            'name': 'Hierarchy Grandchild', 'icd10_code': 'Y10.11', 'danger_level': 'high', 'parent_id': child.id
+        })
+        visit = self._create_past_visit(self.patient)
+        self._create_diagnosis(visit, parent)
+        self._create_diagnosis(visit, child)
+        self._create_diagnosis(visit, grandchild, severity='severe')
+        self._create_diagnosis(visit, grandchild, approved=False)
+
+        diseases = parent | child | grandchild
+        self.assertEqual(diseases.get_hierarchy_diagnosis_counts(doctor_ids=self.doctor.ids), {
+            parent.id: 3,
+            child.id: 2,
+            grandchild.id: 1,
+        })
+        self.assertEqual(
+            child.get_hierarchy_diagnosis_counts(doctor_ids=self.doctor.ids, approved_only=False),
+            {child.id: 3}
+        )
+
     def test_diagnosis_approval(self):
         """Test diagnosis approval workflow"""
         # Create visit and diagnosis
@@ -1,8 +1,56 @@
 # -*- coding: utf-8 -*-
+import csv
+import os
+import tempfile
 from datetime import timedelta
 
-from odoo import models, fields
-from odoo.exceptions import ValidationError
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError, ValidationError
+
+from ..models.hr_hospital_cache import MISSING, report_cache
+
+REPORT_GROUP_BY = [
+    ('doctor', 'By Doctor'),
+    ('disease', 'By Disease'),
+    ('month', 'By Month'),
+    ('country', 'By Country'),
+    ('severity', 'By Severity')
+]
+
+# Report dimension -> (groupby spec on the daily rollup, group key, nested breakdown key)
+REPORT_DIMENSIONS = {
+    'doctor': ('doctor_id', 'doctor', 'doctors'),
+    'disease': ('disease_id', 'disease', 'diseases'),
+    'month': ('day:month', 'month', 'months'),
+    'country': ('country_id', 'country', 'countries'),
+    'severity': ('severity', 'severity', 'severities'),
+}
+
+# Diagnoses read per keyset page by the row-level export
+EXPORT_CHUNK_SIZE = 5000
+
+# Rows of an XLSX worksheet, header included; further rows go to a new worksheet
+XLSX_MAX_ROWS = 1048576
+
+# Exports are stored straight in the filestore, so even text/csv is never indexed
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Nested breakdown used when none is selected
+DEFAULT_SUB_GROUP_BY = {
+    'doctor': 'disease',
+    'disease': 'doctor',
+    'month': 'disease',
+    'country': 'disease',
+    'severity': 'disease',
+}
 
 
 class HrHospitalDiseaseReportWizard(models.TransientModel):
@@ -37,18 +85,31 @@ class HrHospitalDiseaseReportWizard(models.TransientModel):
         ('summary', 'Summary Report')
     ], default='detailed', required=True)
 
-    group_by = fields.Selection([
-        ('doctor', 'By Doctor'),
-        ('disease', 'By Disease'),
-        ('month', 'By Month'),
-        ('country', 'By Country')
-    ], default='disease')
+    group_by = fields.Selection(REPORT_GROUP_BY, default='disease')
+
+    sub_group_by = fields.Selection(
+        REPORT_GROUP_BY,
+        string='Breakdown',
+        help='Second level breakdown of each group. Same as the grouping for a flat report.'
+    )
+
+    export_format = fields.Selection([
+        ('csv', 'CSV'),
+        ('xlsx', 'Excel (XLSX)')
+    ], default='csv', required=True)
+
+    include_subcategories = fields.Boolean(
+        string='Roll Up to Categories',
+        help='When grouping by disease, count the diagnoses of every subcategory '
+             'in each parent category (e.g. all infectious diseases). '
+             'No breakdown is computed in this mode.'
+    )
 
     def _get_base_domain(self):
         """Get base domain for diagnoses"""
         return [
             ('diagnosis_date', '>=', self.start_date),
-            ('diagnosis_date', '<=', self.end_date),
+            ('diagnosis_date', '<', self.end_date + timedelta(days=1)),
             ('is_approved', '=', True)
         ]
 
@@ -58,82 +119,183 @@ class HrHospitalDiseaseReportWizard(models.TransientModel):
             domain.append(('doctor_id', 'in', self.doctor_ids.ids))
 
         if self.disease_ids:
-            domain.append(('disease_id', 'in', self.disease_ids.ids))
+            operator = 'child_of' if self.include_subcategories else 'in'
+            domain.append(('disease_id', operator, self.disease_ids.ids))
 
         if self.country_ids:
-            domain.append(('patient_id.country_id', 'in', self.country_ids.ids))
+            domain.append(('patient_country_id', 'in', self.country_ids.ids))
 
         return domain
 
-    def _group_by_doctor(self, diagnoses):
-        """Group diagnoses by doctor"""
-        doctors = {}
-        for diagnosis in diagnoses:
-            doctor_name = diagnosis.doctor_id.full_name
-            if doctor_name not in doctors:
-                doctors[doctor_name] = {
-                    'doctor': doctor_name,
-                    'count': 0,
-                    'diseases': {}
-                }
-            doctors[doctor_name]['count'] += 1
-
-            disease_name = diagnosis.disease_id.name
-            if disease_name not in doctors[doctor_name]['diseases']:
-                doctors[doctor_name]['diseases'][disease_name] = 0
-            doctors[doctor_name]['diseases'][disease_name] += 1
-
-        return list(doctors.values())
-
-    def _group_by_disease(self, diagnoses):
-        """Group diagnoses by disease"""
-        diseases = {}
-        for diagnosis in diagnoses:
-            disease_name = diagnosis.disease_id.name
-            if disease_name not in diseases:
-                diseases[disease_name] = {
-                    'disease': disease_name,
-                    'count': 0,
-                    'doctors': {}
-                }
-            diseases[disease_name]['count'] += 1
-
-            doctor_name = diagnosis.doctor_id.full_name
-            if doctor_name not in diseases[disease_name]['doctors']:
-                diseases[disease_name]['doctors'][doctor_name] = 0
-            diseases[disease_name]['doctors'][doctor_name] += 1
-
-        return list(diseases.values())
-
-    def _group_by_month(self, diagnoses):
-        """Group diagnoses by month"""
-        months = {}
-        for diagnosis in diagnoses:
-            month_key = diagnosis.diagnosis_date.strftime('%Y-%m')
-            if month_key not in months:
-                months[month_key] = {
-                    'month': month_key,
-                    'count': 0,
-                    'diseases': {}
-                }
-            months[month_key]['count'] += 1
-
-            disease_name = diagnosis.disease_id.name
-            if disease_name not in months[month_key]['diseases']:
-                months[month_key]['diseases'][disease_name] = 0
-            months[month_key]['diseases'][disease_name] += 1
-
-        return list(months.values())
-
-    def _get_grouped_data(self, diagnoses):
-        """Get data grouped according to selected grouping"""
-        if self.group_by == 'doctor':
-            return self._group_by_doctor(diagnoses)
-        if self.group_by == 'disease':
-            return self._group_by_disease(diagnoses)
-        if self.group_by == 'month':
-            return self._group_by_month(diagnoses)
-        return []
+    def _get_rollup_domain(self):
+        """Domain on the daily rollup matching the wizard filters"""
+        domain = [
+            ('day', '>=', self.start_date),
+            ('day', '<=', self.end_date),
+            ('approved_count', '>', 0)
+        ]
+        if self.doctor_ids:
+            domain.append(('doctor_id', 'in', self.doctor_ids.ids))
+        if self.disease_ids:
+            operator = 'child_of' if self.include_subcategories else 'in'
+            domain.append(('disease_id', operator, self.disease_ids.ids))
+        if self.country_ids:
+            domain.append(('country_id', 'in', self.country_ids.ids))
+        return domain
+
+    def _get_dimensions(self):
+        """Outer and inner report dimensions of the wizard"""
+        group_by = self.group_by or 'disease'
+        return group_by, self.sub_group_by or DEFAULT_SUB_GROUP_BY[group_by]
+
+    def _get_hierarchy_data(self):
+        """Get counts per disease category, including every subcategory"""
+        counts = self.disease_ids.get_hierarchy_diagnosis_counts(
+            date_from=self.start_date,
+            date_to=self.end_date,
+            doctor_ids=self.doctor_ids.ids,
+            country_ids=self.country_ids.ids,
+        )
+        return [{'key': disease_id, 'count': count} for disease_id, count in counts.items()]
+
+    def _get_group_labels(self, dimension, keys, complete_name=False):
+        """Human readable labels of grouping keys, as {key: label}
+
+        Records are read once for all the keys, so renamed doctors, countries
+        and diseases show their current name on every report.
+        """
+        labels = {key: _('Undefined') for key in keys if not key}
+        keys = [key for key in keys if key]
+        if dimension == 'month':
+            labels.update((key, key.strftime('%Y-%m')) for key in keys)
+        elif dimension == 'severity':
+            severity_labels = self._get_severity_labels()
+            labels.update((key, severity_labels.get(key, key)) for key in keys)
+        else:
+            field_name = REPORT_DIMENSIONS[dimension][0]
+            comodel = self.env['hr.hospital.diagnosis.daily']._fields[field_name].comodel_name
+            if dimension == 'doctor':
+                label_field = 'full_name'
+            else:
+                label_field = 'complete_name' if complete_name else 'name'
+            for record in self.env[comodel].browse(keys).exists():
+                labels[record.id] = record[label_field]
+            labels.update((key, _('Undefined')) for key in keys if key not in labels)
+        return labels
+
+    def _get_severity_labels(self):
+        return dict(self.env['hr.hospital.diagnosis']._fields['severity']._description_selection(self.env))
+
+    def _get_grouped_data(self):
+        """Get data grouped according to selected grouping, read from the daily rollup
+
+        Groups hold raw keys (ids, months, selection values); labels are only
+        resolved when the data is served, see _label_report_data().
+        """
+        group_by, sub_group_by = self._get_dimensions()
+        outer_field = REPORT_DIMENSIONS[group_by][0]
+        inner_field = REPORT_DIMENSIONS[sub_group_by][0]
+
+        groupby = [outer_field] if sub_group_by == group_by else [outer_field, inner_field]
+        rows = self.env['hr.hospital.diagnosis.daily']._read_group(
+            self._get_rollup_domain(), groupby, ['approved_count:sum']
+        )
+
+        def raw_key(value):
+            return value.id if isinstance(value, models.BaseModel) else value
+
+        groups = {}
+        for row in rows:
+            outer_value, count = raw_key(row[0]), row[-1]
+            group = groups.get(outer_value)
+            if group is None:
+                group = groups[outer_value] = {'key': outer_value, 'count': 0}
+                if len(groupby) > 1:
+                    group['breakdown'] = {}
+            group['count'] += count
+            if len(groupby) > 1:
+                inner_value = raw_key(row[1])
+                group['breakdown'][inner_value] = group['breakdown'].get(inner_value, 0) + count
+
+        return list(groups.values())
+
+    def _label_report_data(self, result):
+        """Copy of a cached report result with the labels of its groups resolved"""
+        group_by, sub_group_by = self._get_dimensions()
+        outer_key = REPORT_DIMENSIONS[group_by][1]
+        inner_nested_key = REPORT_DIMENSIONS[sub_group_by][2]
+        hierarchy = self.include_subcategories and group_by == 'disease'
+
+        raw_groups = result['data']
+        labels = self._get_group_labels(group_by, [group['key'] for group in raw_groups], complete_name=hierarchy)
+        inner_labels = self._get_group_labels(
+            sub_group_by, list({key for group in raw_groups for key in group.get('breakdown', ())})
+        )
+
+        data = []
+        for group in raw_groups:
+            labelled = {outer_key: labels[group['key']], 'count': group['count']}
+            if 'breakdown' in group:
+                nested = labelled[inner_nested_key] = {}
+                for inner_value, count in group['breakdown'].items():
+                    inner_label = inner_labels[inner_value]
+                    nested[inner_label] = nested.get(inner_label, 0) + count
+            data.append(labelled)
+        if hierarchy:
+            data.sort(key=lambda group: group[outer_key])
+        return dict(result, data=data)
+
+    def _get_report_cache_key(self):
+        """Cache key of the report: database, date range first, then every filter"""
+        return (
+            self.env.cr.dbname,
+            self.start_date,
+            self.end_date,
+            tuple(sorted(self.doctor_ids.ids)),
+            tuple(sorted(self.disease_ids.ids)),
+            tuple(sorted(self.country_ids.ids)),
+            self.group_by,
+            self.sub_group_by,
+            self.include_subcategories,
+        )
+
+    def _get_report_result(self):
+        """Report result, served from the report cache when the filters were seen before"""
+        key = self._get_report_cache_key()
+        # Rollup changes committed by any worker change the version of their days
+        Stamp = self.env['hr.hospital.diagnosis.daily.stamp']
+        version = Stamp._get_version(self.start_date, self.end_date)
+        entry = report_cache.get(key)
+        if entry is not MISSING and entry[0] == version:
+            return self._label_report_data(entry[1])
+        result = self._compute_report_result()
+        report_cache.set(key, (version, result))
+        return self._label_report_data(result)
+
+    @api.model
+    def get_report_cache_stats(self):
+        """Hit/miss counters of the report cache of this worker, for monitoring"""
+        return report_cache.stats()
+
+    def _compute_report_result(self):
+        # Data retrieval
+        if self.include_subcategories and self.group_by == 'disease':
+            data = self._get_hierarchy_data()
+            # Categories overlap, so the total is counted separately
+            [(total,)] = self.env['hr.hospital.diagnosis.daily']._read_group(
+                self._get_rollup_domain(), [], ['approved_count:sum']
+            )
+        else:
+            data = self._get_grouped_data()
+            total = sum(group['count'] for group in data)
+
+        # Result structure, with raw group keys
+        return {
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'total_diagnoses': total or 0,
+            'data': data
+        }
 
     # Report generation method
     def action_generate_report(self):
@@ -143,31 +305,166 @@ class HrHospitalDiseaseReportWizard(models.TransientModel):
         if self.start_date > self.end_date:
             raise ValidationError(_('Start date cannot be later than end date.'))
 
-        # Domain formation
-        domain = self._get_base_domain()
-        domain = self._apply_filters(domain)
+        result = self._get_report_result()
+        report = self._save_report_result(result)
 
-        # Data retrieval
-        diagnoses = self.env['hr.hospital.diagnosis'].search(domain)
-
-        # Result structure
-        result = {
-            'start_date': self.start_date,
-            'end_date': self.end_date,
-            'total_diagnoses': len(diagnoses),
-            'data': self._get_grouped_data(diagnoses)
-        }
-
-        # Action return
+        # Action return: the client loads the stored result page by page
         return {
             'name': 'Disease Report',
             'type': 'ir.actions.act_window',
-            'res_model': 'hr.hospital.disease.report.wizard',
+            'res_model': 'hr.hospital.disease.report.result',
             'view_mode': 'form',
-            'target': 'new',
-            'res_id': self.id,
-            'context': {
-                'report_data': result
+            'target': 'current',
+            'res_id': report.id,
+        }
+
+    def action_rebuild_rollup(self):
+        """Recompute the daily rollup over the report date range"""
+        self.ensure_one()
+        if self.start_date > self.end_date:
+            raise ValidationError(_('Start date cannot be later than end date.'))
+        self.env['hr.hospital.diagnosis.daily'].rebuild(self.start_date, self.end_date)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Diagnosis Rollup'),
+                'message': _('Daily counts rebuilt from %(start)s to %(end)s.', start=self.start_date, end=self.end_date),
+                'type': 'success',
+                'next': {'type': 'ir.actions.act_window_close'},
+            },
+        }
+
+    def _save_report_result(self, result):
+        """Store the result server-side as a result record with one line per group"""
+        group_key = REPORT_DIMENSIONS[self.group_by or 'disease'][1]
+        nested_keys = {nested_key for _field, _key, nested_key in REPORT_DIMENSIONS.values()}
+        lines = []
+        for sequence, group in enumerate(result['data']):
+            breakdown = next((group[key] for key in nested_keys if key in group), None)
+            lines.append((0, 0, {
+                'sequence': sequence,
+                'label': group[group_key],
+                'count': group['count'],
+                'breakdown': breakdown,
+            }))
+
+        return self.env['hr.hospital.disease.report.result'].create({
+            'name': _('Disease Report %(start)s - %(end)s', start=self.start_date, end=self.end_date),
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'group_by': self.group_by,
+            'sub_group_by': self.sub_group_by,
+            'include_subcategories': self.include_subcategories,
+            'total_diagnoses': result['total_diagnoses'],
+            'line_count': len(lines),
+            'line_ids': lines,
+        })
+
+    # Row-level export
+    def _get_export_header(self):
+        return [
+            _('Reference'), _('Examination Date'), _('Disease'), _('ICD-10 Code'),
+            _('Doctor'), _('Patient Country'), _('Severity'), _('Approval Date')
+        ]
+
+    def _iter_export_rows(self):
+        """Yield one row per diagnosis, read in keyset-paginated chunks of needed columns only"""
+        Diagnosis = self.env['hr.hospital.diagnosis']
+        Disease = self.env['hr.hospital.disease']
+        severity_labels = dict(Diagnosis._fields['severity']._description_selection(self.env))
+        domain = self._apply_filters(self._get_base_domain())
+
+        last_id = 0
+        while True:
+            rows = Diagnosis.search_read(
+                domain + [('id', '>', last_id)],
+                ['name', 'diagnosis_date', 'disease_id', 'doctor_id', 'patient_country_id',
+                 'severity', 'approval_date'],
+                limit=EXPORT_CHUNK_SIZE,
+                order='id'
+            )
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+
+            disease_ids = {row['disease_id'][0] for row in rows if row['disease_id']}
+            icd10_codes = {
+                disease['id']: disease['icd10_code']
+                for disease in Disease.browse(disease_ids).read(['icd10_code'])
             }
+            for row in rows:
+                yield [
+                    row['name'] or '',
+                    fields.Datetime.to_string(row['diagnosis_date']),
+                    row['disease_id'][1] if row['disease_id'] else '',
+                    icd10_codes.get(row['disease_id'] and row['disease_id'][0]) or '',
+                    row['doctor_id'][1] if row['doctor_id'] else '',
+                    row['patient_country_id'][1] if row['patient_country_id'] else '',
+                    severity_labels.get(row['severity'], ''),
+                    fields.Datetime.to_string(row['approval_date']) if row['approval_date'] else '',
+                ]
+
+            # Keep memory flat: drop the records of this chunk from the cache
+            self.env.invalidate_all()
+
+    def _write_export_csv(self, path):
+        with open(path, 'w', newline='', encoding='utf-8') as output:
+            writer = csv.writer(output)
+            writer.writerow(self._get_export_header())
+            for row in self._iter_export_rows():
+                writer.writerow(row)
+
+    def _write_export_xlsx(self, path):
+        """Write the rows to a workbook, starting a new worksheet whenever one is full"""
+        if xlsxwriter is None:
+            raise UserError(_('The Python library xlsxwriter is required for XLSX exports.'))
+        header = self._get_export_header()
+        # constant_memory flushes every row to disk once the next one starts
+        workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+        sheet, row_index = None, XLSX_MAX_ROWS
+        for row in self._iter_export_rows():
+            if row_index == XLSX_MAX_ROWS:
+                sheet_name = _('Diagnoses')
+                if workbook.worksheets():
+                    sheet_name = f'{sheet_name} ({len(workbook.worksheets()) + 1})'
+                sheet = workbook.add_worksheet(sheet_name)
+                sheet.write_row(0, 0, header)
+                row_index = 1
+            sheet.write_row(row_index, 0, row)
+            row_index += 1
+        if sheet is None:
+            workbook.add_worksheet(_('Diagnoses')).write_row(0, 0, header)
+        workbook.close()
+
+    def action_export_diagnoses(self):
+        """Export every matching diagnosis to a CSV/XLSX attachment, streaming through a temporary file"""
+        self.ensure_one()
+
+        if self.start_date > self.end_date:
+            raise ValidationError(_('Start date cannot be later than end date.'))
+
+        file_name = f'diagnoses_{self.start_date}_{self.end_date}.{self.export_format}'
+        handle, path = tempfile.mkstemp(suffix=f'.{self.export_format}')
+        os.close(handle)
+        try:
+            if self.export_format == 'xlsx':
+                self._write_export_xlsx(path)
+            else:
+                self._write_export_csv(path)
+            # Linked to the wizard, so the export goes away with it
+            attachment = self.env['ir.attachment']._create_from_file(path, {
+                'name': file_name,
+                'mimetype': EXPORT_MIMETYPES[self.export_format],
+                'res_model': self._name,
+                'res_id': self.id,
+            })
+        finally:
+            os.unlink(path)
+
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f'/web/content/{attachment.id}?download=true',
+            'target': 'self',
         }
 
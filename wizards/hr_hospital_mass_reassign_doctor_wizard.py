@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 import logging
-from odoo import models, fields, api
+from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
 
 _logger = logging.getLogger(__name__)
@@ -47,22 +47,22 @@ class HrHospitalMassReassignDoctorWizard(models.TransientModel):
         if self.old_doctor_id == self.new_doctor_id:
             raise ValidationError(_('The current and new doctor cannot be the same person.'))
 
-        # Mass update logic
-        for patient in self.patient_ids:
-            # Create history record
-            # The history model logic already handles deactivation of old records via override
-            self.env['hr.hospital.patient.doctor.history'].create({
-                'patient_id': patient.id,
-                'doctor_id': self.new_doctor_id.id,
-                'assignment_date': self.change_date,
-                'reason': self.reason,
-                'active': True
-            })
-
-            # Update personal doctor on patient record
-            patient.write({
-                'personal_doctor_id': self.new_doctor_id.id
-            })
+        # Mass update logic: one grouped write on the patients, whose own
+        # history tracking is skipped in favour of the batched history below
+        patients = self.patient_ids.filtered(lambda p: p.personal_doctor_id != self.new_doctor_id)
+        patients.with_context(skip_doctor_history=True).write({
+            'personal_doctor_id': self.new_doctor_id.id
+        })
+
+        # One history row per patient; the history create deactivates the
+        # previous rows of all these patients at once
+        self.env['hr.hospital.patient.doctor.history'].create([{
+            'patient_id': patient.id,
+            'doctor_id': self.new_doctor_id.id,
+            'assignment_date': self.change_date,
+            'reason': self.reason,
+            'active': True
+        } for patient in patients])
 
         # Return success notification
         return {
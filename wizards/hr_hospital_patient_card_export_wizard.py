@@ -1,11 +1,27 @@
 # -*- coding: utf-8 -*-
-import base64
 import csv
+import hashlib
 import json
-from io import StringIO
+import os
+import tempfile
+from datetime import timedelta
 
-from odoo import models, fields, api
+from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
+from odoo.tools.safe_eval import safe_eval
+
+# Attachment mimetype per export format
+EXPORT_MIMETYPES = {
+    'json': 'application/json',
+    'csv': 'text/csv',
+}
+
+# Rows of a card section (diagnoses, visits, history) read at once
+CARD_SECTION_CHUNK_SIZE = 1000
+
+# Single card exports are removed by the autovacuum after this many days; they
+# can only be reused on the day they were written anyway
+CARD_RETENTION_DAYS = 7
 
 
 class HrHospitalPatientCardExportWizard(models.TransientModel):
@@ -13,9 +29,24 @@ class HrHospitalPatientCardExportWizard(models.TransientModel):
     _description = 'Patient Medical Card Export Wizard'
 
     # Fields
+    export_scope = fields.Selection([
+        ('single', 'Single Patient'),
+        ('bulk', 'Multiple Patients')
+    ], default='single', required=True)
+
     patient_id = fields.Many2one(
+        'hr.hospital.patient'
+    )
+
+    # Bulk export: selected patients, or every patient matching the domain
+    patient_ids = fields.Many2many(
         'hr.hospital.patient',
-        required=True
+        string='Patients'
+    )
+
+    patient_domain = fields.Char(
+        default='[]',
+        help='Patients to export when none are selected, e.g. all patients of an insurer'
     )
 
     start_date = fields.Date()
@@ -31,7 +62,7 @@ class HrHospitalPatientCardExportWizard(models.TransientModel):
 
     lang_id = fields.Many2one(
         'res.lang',
-        default=lambda self: self.patient_id.lang_id or self.env.user.lang
+        default=lambda self: self.env['res.lang']._lang_get(self.env.user.lang)
     )
 
     export_format = fields.Selection([
@@ -39,102 +70,256 @@ class HrHospitalPatientCardExportWizard(models.TransientModel):
         ('csv', 'CSV')
     ], default='json', required=True)
 
-    export_data = fields.Binary(readonly=True)
     file_name = fields.Char(compute='_compute_file_name')
 
     @api.depends('patient_id', 'export_format')
     def _compute_file_name(self):
         for wizard in self:
             if wizard.patient_id and wizard.export_format:
-                clean_name = wizard.patient_id.full_name.replace(" ", "_")
-                wizard.file_name = f'medical_card_{clean_name}.{wizard.export_format}'
+                wizard.file_name = wizard._get_card_file_name(wizard.patient_id.full_name)
             else:
                 wizard.file_name = 'medical_card.unknown'
 
-    def _get_patient_basic_data(self):
-        """Get basic patient information"""
+    def _get_card_file_name(self, full_name, patient_id=None):
+        """File name of a card; the patient id keeps names unique inside a bulk archive"""
+        clean_name = (full_name or '').replace(" ", "_")
+        suffix = f'_{patient_id}' if patient_id else ''
+        return f'medical_card_{clean_name}{suffix}.{self.export_format}'
+
+    # Batched data collectors
+    def _get_selection_labels(self, model_name, field_name):
+        """Map the values of a selection field to their labels"""
+        field = self.env[model_name]._fields[field_name]
+        return dict(field._description_selection(self.env))
+
+    def _get_names(self, model_name, ids, field_name='name'):
+        """Read one name column for a set of ids in a single query"""
+        ids = {record_id for record_id in ids if record_id}
+        if not ids:
+            return {}
+        records = self.env[model_name].browse(ids).read([field_name])
+        return {record['id']: record[field_name] or '' for record in records}
+
+    def _get_date_domain(self, field_name):
+        domain = []
+        if self.start_date:
+            domain.append((field_name, '>=', self.start_date))
+        if self.end_date:
+            domain.append((field_name, '<', self.end_date + timedelta(days=1)))
+        return domain
+
+    def _collect_patient_basic_data(self, patient_ids):
+        """Basic information of every patient, keyed by patient id"""
+        patients = self.env['hr.hospital.patient'].browse(patient_ids).read([
+            'full_name', 'birth_date', 'age', 'gender', 'blood_group', 'allergies',
+            'chronic_diseases', 'personal_doctor_id', 'insurance_company_id',
+            'insurance_policy_number', 'passport', 'country_id', 'lang_id'
+        ], load=False)
+        gender_labels = self._get_selection_labels('hr.hospital.patient', 'gender')
+        doctor_names = self._get_names(
+            'hr.hospital.doctor', [patient['personal_doctor_id'] for patient in patients], 'full_name'
+        )
+        insurer_names = self._get_names(
+            'res.partner', [patient['insurance_company_id'] for patient in patients]
+        )
+        country_names = self._get_names('res.country', [patient['country_id'] for patient in patients])
+        lang_names = self._get_names('res.lang', [patient['lang_id'] for patient in patients])
+
+        return {patient['id']: {
+            'full_name': patient['full_name'],
+            'birth_date': str(patient['birth_date']) if patient['birth_date'] else '',
+            'age': patient['age'],
+            'gender': gender_labels.get(patient['gender']),
+            'blood_group': patient['blood_group'],
+            'allergies': patient['allergies'],
+            'chronic_diseases': patient['chronic_diseases'],
+            'personal_doctor': doctor_names.get(patient['personal_doctor_id'], ''),
+            'insurance_company': insurer_names.get(patient['insurance_company_id'], ''),
+            'insurance_policy': patient['insurance_policy_number'],
+            'passport': patient['passport'],
+            'country': country_names.get(patient['country_id'], ''),
+            'language': lang_names.get(patient['lang_id'], '')
+        } for patient in patients}
+
+    def _iter_read_chunks(self, model_name, domain, field_names, order=None):
+        """Read the records matching domain, yielding the rows chunk by chunk
+
+        Only the ids are kept for the whole search; each chunk is dropped from
+        the cache once the next one is read.
+        """
+        Model = self.env[model_name]
+        record_ids = Model.search(domain, order=order).ids
+        for index in range(0, len(record_ids), CARD_SECTION_CHUNK_SIZE):
+            yield Model.browse(record_ids[index:index + CARD_SECTION_CHUNK_SIZE]).read(field_names, load=False)
+            Model.invalidate_model(field_names)
+
+    def _group_by_patient(self, patient_ids, items):
+        """Group (patient id, item) pairs into lists keyed by patient id"""
+        result = {patient_id: [] for patient_id in patient_ids}
+        for patient_id, item in items:
+            result[patient_id].append(item)
+        return result
+
+    def _iter_diagnoses_data(self, patient_ids):
+        """Diagnoses within the date range, as (patient id, diagnosis data) pairs"""
+        severity_labels = self._get_selection_labels('hr.hospital.diagnosis', 'severity')
+        for diagnoses in self._iter_read_chunks(
+            'hr.hospital.diagnosis',
+            [('patient_id', 'in', list(patient_ids))] + self._get_date_domain('diagnosis_date'),
+            ['patient_id', 'diagnosis_date', 'disease_id', 'doctor_id', 'severity', 'description',
+             'prescribed_treatment', 'is_approved', 'approved_doctor_id', 'approval_date'],
+            order='diagnosis_date desc, id desc'
+        ):
+            disease_names = self._get_names('hr.hospital.disease', [diag['disease_id'] for diag in diagnoses])
+            doctor_names = self._get_names('hr.hospital.doctor', [
+                doctor_id for diag in diagnoses for doctor_id in (diag['doctor_id'], diag['approved_doctor_id'])
+            ], 'full_name')
+
+            for diag in diagnoses:
+                yield diag['patient_id'], {
+                    'date': diag['diagnosis_date'].strftime('%Y-%m-%d %H:%M'),
+                    'disease': disease_names.get(diag['disease_id'], ''),
+                    'doctor': doctor_names.get(diag['doctor_id'], ''),
+                    'severity': severity_labels.get(diag['severity']),
+                    'description': diag['description'],
+                    'prescribed_treatment': diag['prescribed_treatment'],
+                    'approved': diag['is_approved'],
+                    'approved_by': doctor_names.get(diag['approved_doctor_id'], ''),
+                    'approval_date': (
+                        diag['approval_date'].strftime('%Y-%m-%d %H:%M') if diag['approval_date'] else ''
+                    )
+                }
+
+    def _collect_diagnoses_data(self, patient_ids):
+        """Diagnoses within the date range, grouped by patient id"""
+        return self._group_by_patient(patient_ids, self._iter_diagnoses_data(patient_ids))
+
+    def _iter_visits_data(self, patient_ids):
+        """Visits within the date range, as (patient id, visit data) pairs"""
+        type_labels = self._get_selection_labels('hr.hospital.visit', 'visit_type')
+        state_labels = self._get_selection_labels('hr.hospital.visit', 'state')
+        for visits in self._iter_read_chunks(
+            'hr.hospital.visit',
+            [('patient_id', 'in', list(patient_ids))] + self._get_date_domain('planned_datetime'),
+            ['patient_id', 'planned_datetime', 'doctor_id', 'visit_type', 'state', 'cost',
+             'currency_id', 'recommendations'],
+            order='planned_datetime desc, id desc'
+        ):
+            doctor_names = self._get_names(
+                'hr.hospital.doctor', [visit['doctor_id'] for visit in visits], 'full_name'
+            )
+            currency_names = self._get_names('res.currency', [visit['currency_id'] for visit in visits])
+
+            for visit in visits:
+                yield visit['patient_id'], {
+                    'date': visit['planned_datetime'].strftime('%Y-%m-%d %H:%M'),
+                    'doctor': doctor_names.get(visit['doctor_id'], ''),
+                    'type': type_labels.get(visit['visit_type']),
+                    'status': state_labels.get(visit['state']),
+                    'cost': visit['cost'],
+                    'currency': currency_names.get(visit['currency_id'], ''),
+                    'recommendations': visit['recommendations']
+                }
+
+    def _collect_visits_data(self, patient_ids):
+        """Visits within the date range, grouped by patient id"""
+        return self._group_by_patient(patient_ids, self._iter_visits_data(patient_ids))
+
+    def _iter_doctor_history_data(self, patient_ids):
+        """Active doctor assignment history, as (patient id, history data) pairs"""
+        for histories in self._iter_read_chunks(
+            'hr.hospital.patient.doctor.history',
+            [('patient_id', 'in', list(patient_ids))],
+            ['patient_id', 'doctor_id', 'assignment_date', 'change_date', 'assignment_duration',
+             'reason', 'active']
+        ):
+            doctor_names = self._get_names(
+                'hr.hospital.doctor', [history['doctor_id'] for history in histories], 'full_name'
+            )
+
+            for history in histories:
+                yield history['patient_id'], {
+                    'doctor': doctor_names.get(history['doctor_id'], ''),
+                    'assignment_date': history['assignment_date'].strftime('%Y-%m-%d'),
+                    'change_date': history['change_date'].strftime('%Y-%m-%d') if history['change_date'] else '',
+                    'duration_days': history['assignment_duration'],
+                    'reason': history['reason'],
+                    'active': history['active']
+                }
+
+    def _collect_doctor_history_data(self, patient_ids):
+        """Active doctor assignment history, grouped by patient id"""
+        return self._group_by_patient(patient_ids, self._iter_doctor_history_data(patient_ids))
+
+    def _collect_cards(self, patients):
+        """Build the card data of every patient with a fixed number of queries, keyed by patient id"""
+        patient_ids = patients.ids
+        basic_data = self._collect_patient_basic_data(patient_ids)
+        diagnoses = self._collect_diagnoses_data(patient_ids) if self.include_diagnoses else {}
+        visits = self._collect_visits_data(patient_ids) if self.include_recommendations else {}
+        history = self._collect_doctor_history_data(patient_ids)
+        return {patient_id: {
+            'patient': basic_data[patient_id],
+            'diagnoses': diagnoses.get(patient_id, []),
+            'visits': visits.get(patient_id, []),
+            'doctor_history': history[patient_id]
+        } for patient_id in patient_ids}
+
+    def _stream_card(self, patient_id):
+        """Card of a single patient whose sections are generators
+
+        Each section is fetched chunk by chunk while the writer consumes it, so
+        the card is never held in memory as a whole.
+        """
+        patient_ids = [patient_id]
+
+        def items(pairs):
+            return (item for _patient_id, item in pairs)
+
         return {
-            'full_name': self.patient_id.full_name,
-            'birth_date': str(self.patient_id.birth_date) if self.patient_id.birth_date else '',
-            'age': self.patient_id.age,
-            'gender': dict(self.patient_id._fields['gender'].selection).get(self.patient_id.gender),
-            'blood_group': self.patient_id.blood_group,
-            'allergies': self.patient_id.allergies,
-            'chronic_diseases': self.patient_id.chronic_diseases,
-            'personal_doctor': self.patient_id.personal_doctor_id.full_name if self.patient_id.personal_doctor_id else '',
-            'insurance_company': self.patient_id.insurance_company_id.name if self.patient_id.insurance_company_id else '',
-            'insurance_policy': self.patient_id.insurance_policy_number,
-            'passport': self.patient_id.passport,
-            'country': self.patient_id.country_id.name if self.patient_id.country_id else '',
-            'language': self.patient_id.lang_id.name if self.patient_id.lang_id else ''
+            'patient': self._collect_patient_basic_data(patient_ids)[patient_id],
+            'diagnoses': items(self._iter_diagnoses_data(patient_ids)) if self.include_diagnoses else (),
+            'visits': items(self._iter_visits_data(patient_ids)) if self.include_recommendations else (),
+            'doctor_history': items(self._iter_doctor_history_data(patient_ids)),
         }
 
+    def _get_patient_basic_data(self):
+        """Get basic patient information"""
+        return self._collect_patient_basic_data(self.patient_id.ids)[self.patient_id.id]
+
     def _get_diagnoses_data(self):
         """Get diagnoses data within date range"""
         if not self.include_diagnoses:
             return []
-
-        domain = [('patient_id', '=', self.patient_id.id)]
-        if self.start_date:
-            domain.append(('diagnosis_date', '>=', self.start_date))
-        if self.end_date:
-            domain.append(('diagnosis_date', '<=', self.end_date))
-
-        diagnoses = self.env['hr.hospital.diagnosis'].search(domain, order='diagnosis_date desc')
-        
-        return [{
-            'date': diagnosis.diagnosis_date.strftime('%Y-%m-%d %H:%M'),
-            'disease': diagnosis.disease_id.name,
-            'doctor': diagnosis.doctor_id.full_name,
-            'severity': dict(diagnosis._fields['severity'].selection).get(diagnosis.severity),
-            'description': diagnosis.description,
-            'prescribed_treatment': diagnosis.prescribed_treatment,
-            'approved': diagnosis.is_approved,
-            'approved_by': diagnosis.approved_doctor_id.full_name if diagnosis.approved_doctor_id else '',
-            'approval_date': diagnosis.approval_date.strftime('%Y-%m-%d %H:%M') if diagnosis.approval_date else ''
-        } for diagnosis in diagnoses]
+        return self._collect_diagnoses_data(self.patient_id.ids)[self.patient_id.id]
 
     def _get_visits_data(self):
         """Get visits data within date range"""
         if not self.include_recommendations:
             return []
-
-        domain = [('patient_id', '=', self.patient_id.id)]
-        if self.start_date:
-            domain.append(('planned_datetime', '>=', self.start_date))
-        if self.end_date:
-            domain.append(('planned_datetime', '<=', self.end_date))
-
-        visits = self.env['hr.hospital.visit'].search(domain, order='planned_datetime desc')
-        
-        return [{
-            'date': visit.planned_datetime.strftime('%Y-%m-%d %H:%M'),
-            'doctor': visit.doctor_id.full_name,
-            'type': dict(visit._fields['visit_type'].selection).get(visit.visit_type),
-            'status': dict(visit._fields['state'].selection).get(visit.state),
-            'cost': visit.cost,
-            'currency': visit.currency_id.name,
-            'recommendations': visit.recommendations
-        } for visit in visits]
+        return self._collect_visits_data(self.patient_id.ids)[self.patient_id.id]
 
     def _get_doctor_history_data(self):
         """Get doctor assignment history"""
-        return [{
-            'doctor': history.doctor_id.full_name,
-            'assignment_date': history.assignment_date.strftime('%Y-%m-%d'),
-            'change_date': history.change_date.strftime('%Y-%m-%d') if history.change_date else '',
-            'duration_days': history.assignment_duration,
-            'reason': history.reason,
-            'active': history.active
-        } for history in self.patient_id.doctor_history_ids]
-
-    def _export_to_json(self, patient_data):
-        """Export data to JSON format"""
-        return json.dumps(patient_data, indent=2, ensure_ascii=False)
-
-    def _export_to_csv(self, patient_data):
-        """Export data to CSV format"""
-        output = StringIO()
+        return self._collect_doctor_history_data(self.patient_id.ids)[self.patient_id.id]
+
+    def _write_json(self, patient_data, output):
+        """Write the card as JSON to a text stream, one section item at a time"""
+        def dumps(value, level):
+            return json.dumps(value, indent=2, ensure_ascii=False).replace('\n', '\n' + '  ' * level)
+
+        output.write('{\n  "patient": ' + dumps(patient_data['patient'], 1))
+        for section in ('diagnoses', 'visits', 'doctor_history'):
+            output.write(f',\n  "{section}": [')
+            separator = '\n    '
+            for item in patient_data.get(section, ()):
+                output.write(separator + dumps(item, 2))
+                separator = ',\n    '
+            output.write(']' if separator == '\n    ' else '\n  ]')
+        output.write('\n}')
+
+    def _write_csv(self, patient_data, output):
+        """Write the card as CSV to a text stream"""
         writer = csv.writer(output)
 
         # Header: Patient Info
@@ -142,60 +327,181 @@ class HrHospitalPatientCardExportWizard(models.TransientModel):
         for key, value in patient_data['patient'].items():
             writer.writerow([key, value])
 
-        # Section: Diagnoses
-        if 'diagnoses' in patient_data and patient_data['diagnoses']:
-            writer.writerow([])
-            writer.writerow(['DIAGNOSES'])
-            writer.writerow(['Date', 'Disease', 'Doctor', 'Severity', 'Description', 'Approved'])
-            for diag in patient_data['diagnoses']:
-                writer.writerow([
-                    diag['date'], diag['disease'], diag['doctor'], diag['severity'],
-                    diag['description'][:100], 'Yes' if diag['approved'] else 'No'
-                ])
+        # Section: Diagnoses, titled once its first row arrives
+        for index, diag in enumerate(patient_data.get('diagnoses', ())):
+            if not index:
+                writer.writerow([])
+                writer.writerow(['DIAGNOSES'])
+                writer.writerow(['Date', 'Disease', 'Doctor', 'Severity', 'Description', 'Approved'])
+            writer.writerow([
+                diag['date'], diag['disease'], diag['doctor'], diag['severity'],
+                (diag['description'] or '')[:100], 'Yes' if diag['approved'] else 'No'
+            ])
 
         # Section: Visits
-        if 'visits' in patient_data and patient_data['visits']:
-            writer.writerow([])
-            writer.writerow(['VISITS'])
-            writer.writerow(['Date', 'Doctor', 'Type', 'Status', 'Cost', 'Currency'])
-            for visit in patient_data['visits']:
-                writer.writerow([
-                    visit['date'], visit['doctor'], visit['type'],
-                    visit['status'], visit['cost'], visit['currency']
-                ])
-
-        return output.getvalue()
+        for index, visit in enumerate(patient_data.get('visits', ())):
+            if not index:
+                writer.writerow([])
+                writer.writerow(['VISITS'])
+                writer.writerow(['Date', 'Doctor', 'Type', 'Status', 'Cost', 'Currency'])
+            writer.writerow([
+                visit['date'], visit['doctor'], visit['type'],
+                visit['status'], visit['cost'], visit['currency']
+            ])
+
+    def _write_card(self, patient_data, output):
+        """Write the card to a text stream in the selected format"""
+        if self.export_format == 'json':
+            self._write_json(patient_data, output)
+        else:  # CSV Format
+            self._write_csv(patient_data, output)
+
+    # Export fingerprints
+    def _get_options_hash(self):
+        """Hash of the export options that shape the content of a card
+
+        Today's date is part of it: the age and assignment durations change
+        every day without touching write_date.
+        """
+        options = [
+            str(self.start_date or ''), str(self.end_date or ''), self.include_diagnoses,
+            self.include_recommendations, self.lang_id.code or '', self.export_format,
+            str(fields.Date.today()),
+        ]
+        return hashlib.sha1(json.dumps(options).encode()).hexdigest()[:16]
+
+    def _get_card_fingerprints(self, patient_ids):
+        """Hash of the exportable data of each patient, keyed by patient id
+
+        Built in one query from the latest write_date and the row count of the
+        patient, their visits, diagnoses and doctor history; the counts catch
+        deleted rows that leave no write_date behind.
+        """
+        for model_name in ('hr.hospital.patient', 'hr.hospital.visit', 'hr.hospital.diagnosis',
+                           'hr.hospital.patient.doctor.history'):
+            self.env[model_name].flush_model()
+        self.env.cr.execute("""
+            SELECT p.id, p.write_date,
+                   v.last_write, v.total, d.last_write, d.total, h.last_write, h.total
+              FROM hr_hospital_patient p
+         LEFT JOIN (SELECT patient_id, MAX(write_date) AS last_write, COUNT(*) AS total
+                      FROM hr_hospital_visit
+                     WHERE patient_id = ANY(%(ids)s)
+                  GROUP BY patient_id) v ON v.patient_id = p.id
+         LEFT JOIN (SELECT patient_id, MAX(write_date) AS last_write, COUNT(*) AS total
+                      FROM hr_hospital_diagnosis
+                     WHERE patient_id = ANY(%(ids)s)
+                  GROUP BY patient_id) d ON d.patient_id = p.id
+         LEFT JOIN (SELECT patient_id, MAX(write_date) AS last_write, COUNT(*) AS total
+                      FROM hr_hospital_patient_doctor_history
+                     WHERE patient_id = ANY(%(ids)s)
+                  GROUP BY patient_id) h ON h.patient_id = p.id
+             WHERE p.id = ANY(%(ids)s)
+        """, {'ids': list(patient_ids)})
+        return {
+            row[0]: hashlib.sha1(repr(row[1:]).encode()).hexdigest()[:16]
+            for row in self.env.cr.fetchall()
+        }
+
+    def _get_reusable_attachment(self):
+        """Attachment of a previous export with the same options and unchanged data
+
+        Earlier exports stay downloadable until _gc_old_card_exports() removes them.
+        """
+        description = 'medical_card:%s:%s' % (
+            self._get_options_hash(), self._get_card_fingerprints(self.patient_id.ids)[self.patient_id.id]
+        )
+        attachment = self.env['ir.attachment'].search([
+            ('res_model', '=', self.patient_id._name),
+            ('res_id', '=', self.patient_id.id),
+            ('description', '=', description),
+        ], limit=1)
+        return attachment, description
+
+    @api.autovacuum
+    def _gc_old_card_exports(self):
+        """Drop the single card exports older than the retention period"""
+        limit_date = fields.Datetime.now() - timedelta(days=CARD_RETENTION_DAYS)
+        self.env['ir.attachment'].search([
+            ('res_model', '=', 'hr.hospital.patient'),
+            ('description', '=like', 'medical_card:%'),
+            ('create_date', '<', limit_date),
+        ]).unlink()
+
+    def _check_dates(self):
+        if self.start_date and self.end_date and self.start_date > self.end_date:
+            raise ValidationError(_('Start date cannot be later than end date.'))
 
     # Export method
     def action_export_patient_card(self):
         self.ensure_one()
 
-        # Date validation
-        if self.start_date and self.end_date and self.start_date > self.end_date:
-            raise ValidationError(_('Start date cannot be later than end date.'))
+        if self.export_scope == 'bulk':
+            return self.action_export_bulk()
+        if not self.patient_id:
+            raise ValidationError(_('Please select the patient to export.'))
 
-        # Data gathering using helper methods
-        patient_data = {
-            'patient': self._get_patient_basic_data(),
-            'diagnoses': self._get_diagnoses_data(),
-            'visits': self._get_visits_data(),
-            'doctor_history': self._get_doctor_history_data()
+        # Date validation
+        self._check_dates()
+        if self.lang_id:
+            self = self.with_context(lang=self.lang_id.code)
+
+        # Unchanged card: hand out the previous export again
+        attachment, description = self._get_reusable_attachment()
+        if attachment:
+            return self._get_download_action(attachment)
+
+        # Stream the card to a temporary file that becomes an attachment of the patient
+        handle, path = tempfile.mkstemp(suffix=f'.{self.export_format}')
+        os.close(handle)
+        try:
+            with open(path, 'w', newline='', encoding='utf-8') as output:
+                self._write_card(self._stream_card(self.patient_id.id), output)
+            attachment = self.env['ir.attachment']._create_from_file(path, {
+                'name': self.file_name,
+                'description': description,
+                'mimetype': EXPORT_MIMETYPES[self.export_format],
+                'res_model': self.patient_id._name,
+                'res_id': self.patient_id.id,
+            })
+        finally:
+            os.unlink(path)
+
+        return self._get_download_action(attachment)
+
+    def _get_download_action(self, attachment):
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f'/web/content/{attachment.id}?download=true',
+            'target': 'self',
         }
 
-        # Export logic
-        if self.export_format == 'json':
-            export_content = self._export_to_json(patient_data)
-        else:  # CSV Format
-            export_content = self._export_to_csv(patient_data)
-
-        # File encoding and return
-        self.write({
-            'export_data': base64.b64encode(export_content.encode('utf-8'))
+    def action_export_bulk(self):
+        """Queue a background job exporting every selected card into one ZIP archive"""
+        self.ensure_one()
+        self._check_dates()
+
+        domain = [('id', 'in', self.patient_ids.ids)] if self.patient_ids else self.patient_domain or '[]'
+        if not self.env['hr.hospital.patient'].search_count(safe_eval(str(domain)), limit=1):
+            raise ValidationError(_('No patients match the selected export scope.'))
+
+        job = self.env['hr.hospital.patient.card.export.job'].create({
+            'name': _('Medical cards %s', fields.Datetime.to_string(fields.Datetime.now())),
+            'patient_domain': str(domain),
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'include_diagnoses': self.include_diagnoses,
+            'include_recommendations': self.include_recommendations,
+            'lang_id': self.lang_id.id,
+            'export_format': self.export_format,
         })
+        self.env.ref('hr_hospital.ir_cron_process_patient_card_export_jobs')._trigger()
 
         return {
-            'type': 'ir.actions.act_url',
-            'url': f'/web/content?model={self._name}&id={self.id}&filename={self.file_name}&field=export_data&download=true',
-            'target': 'self',
+            'type': 'ir.actions.act_window',
+            'res_model': job._name,
+            'res_id': job.id,
+            'view_mode': 'form',
+            'target': 'current',
         }
 